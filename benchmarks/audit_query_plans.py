@@ -0,0 +1,149 @@
+"""Проверка планов запросов utils/db.py.
+
+Выполняет все функции работы с базой на временной базе, собирает
+выполненные запросы и проверяет через EXPLAIN QUERY PLAN, что ни один из
+них не просматривает таблицу целиком. Полный просмотр допускается только
+там, где он нужен по смыслу (фоновое начисление продукции всем игрокам).
+
+Запуск: python benchmarks/audit_query_plans.py [--verbose]
+Код возврата 1, если найдены запросы с полным просмотром таблиц.
+"""
+import os
+import re
+import sys
+import argparse
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db, db_pool
+from utils.player_cache import player_cache
+
+# Запросы, которым полный просмотр разрешен
+ALLOWED_FULL_SCANS = (
+    'FROM production_ledger l',  # settle_all_production: начисление всем игрокам
+    'FROM production_tick',  # settle_all_production: временная таблица начисления
+    'FROM players p LEFT JOIN country_regions cr',  # check_regions_consistency: проверка всех игроков
+    'FROM country_regions cr LEFT JOIN players p',  # check_regions_consistency: проверка всех регионов
+)
+
+PLAN_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')
+SCAN_RE = re.compile(r'^SCAN (?!CONSTANT ROW|\()(\S+)')
+
+def exercise():
+    """Вызывает все функции utils/db.py, которые обращаются к базе"""
+    for user_id, name in ((1, 'attacker'), (2, 'defender')):
+        db.create_player(user_id, name)
+        db.set_player_country(user_id, 'Украина')
+    db.create_players([(3, 'member3'), (4, 'member4')])
+    db.ensure_player(5, 'member5')
+    db.set_player_political_system(1, 'democracy')
+    db.get_player_data(1)
+    db.check_has_country(1)
+    db.get_adjusted_production_rate(1, 1000)
+    db.get_adjusted_military_power(1, 1000)
+
+    db.update_budget(1, 10 ** 9)
+    db.get_budget(1)
+    db.update_inventory(1, 'ammo', 10 ** 6)
+    db.get_inventory(1)
+    db.add_inventory(1, 'ammo', 1)
+    db.purchase_units(1, 'infantry', 10)
+    db.purchase_units(2, 'infantry', 10 ** 6)
+
+    db.build_factory(1)
+    db.purchase_factory(1)
+    db.add_budget(1, 1)
+    db.get_factories_count(1)
+    db.calculate_production(1)
+    db.settle_production(1)
+    db.settle_all_production(dry_run=True)
+    db.settle_all_production()
+
+    db.log_battle(1, 2, 10, 10, 1, 1, 1)
+    db.resolve_battle(1, 2, {'infantry': 1}, {'infantry': 1}, 10, 10, 1)
+    db.get_battle_history(1)
+    battles, _ = db.get_battle_history_page(1, limit=1)
+    db.get_battle_history_page(1, (battles[0][1], battles[0][0]), limit=1)
+    db.get_battle_history_page(1, (battles[0][1], battles[0][0]), newer=True, limit=1)
+    players, _ = db.get_leaderboard_page(limit=1)
+    db.get_leaderboard_page((players[0][3], players[0][0]), limit=1)
+    db.get_leaderboard_page((players[0][3], players[0][0]), newer=True, limit=1)
+
+    db.get_player_regions(1)
+    db.set_player_regions(1, db.get_player_regions(1))
+    db.get_player_controlled_regions(1)
+    db.get_region_states(1)
+    db.get_region_control_status(1, 'kyiv_region')
+    db.change_region_control(1, 'kyiv_region', False)
+    db.set_region_damage(2, 'lviv', True, 2)
+    db.repair_region(2, 'lviv')
+    db.check_regions_consistency()
+    db.get_adjusted_economic_bonus(1)
+    db.get_adjusted_production_with_regions(1, 1000)
+    db.get_adjusted_military_power_with_regions(1, 1000)
+
+def collect_statements(path):
+    """Возвращает список уникальных запросов, выполненных функциями utils/db.py"""
+    statements = []
+    db_pool.init_pool(path)
+    db.init_db()
+    player_cache.clear()
+    with db_pool.get_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            exercise()
+        finally:
+            conn.set_trace_callback(None)
+    db_pool.get_pool().close_all()
+
+    unique = []
+    for sql in statements:
+        sql = ' '.join(sql.split())
+        if sql.upper().startswith(PLAN_STATEMENTS) and 'sqlite_master' not in sql and sql not in unique:
+            unique.append(sql)
+    return unique
+
+def full_scans(conn, sql):
+    """Возвращает таблицы, которые запрос просматривает целиком"""
+    try:
+        plan = conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+    except sqlite3.OperationalError:
+        # Запрос к временной таблице, которой уже нет
+        return None, []
+    scans = []
+    for row in plan:
+        match = SCAN_RE.match(row[3])
+        # Табличные функции (json_each) просматривают только переданное значение
+        if match and 'VIRTUAL TABLE' not in row[3]:
+            scans.append(match.group(1))
+    return plan, scans
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help='Показать планы всех запросов')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'audit.db')
+        statements = collect_statements(path)
+        conn = sqlite3.connect(path)
+
+        problems = 0
+        for sql in statements:
+            plan, scans = full_scans(conn, sql)
+            allowed = any(marker in sql for marker in ALLOWED_FULL_SCANS)
+            failed = bool(scans) and not allowed
+            problems += failed
+            if failed or args.verbose:
+                print(("ПОЛНЫЙ ПРОСМОТР: " if failed else "") + sql[:200])
+                for row in plan or []:
+                    print(f"    {row[3]}")
+        conn.close()
+
+    print(f"Проверено запросов: {len(statements)}, с полным просмотром таблиц: {problems}")
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
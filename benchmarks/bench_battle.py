@@ -0,0 +1,78 @@
+"""Бенчмарк записи результатов боя.
+
+Сравнивает прежний путь (отдельный коммит update_inventory на каждый
+тип юнитов обеих сторон плюс log_battle) с resolve_battle, который
+применяет все потери и запись в историю одной транзакцией.
+
+Запуск: python benchmarks/bench_battle.py [--battles N]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db, db_pool
+from config.config import UNITS_INFO
+
+ATTACKER_ID = 1
+DEFENDER_ID = 2
+START_UNITS = 10 ** 9
+
+def prepare(path):
+    db_pool.init_pool(path)
+    db.init_db()
+    for user_id in (ATTACKER_ID, DEFENDER_ID):
+        db.create_player(user_id, f'bench{user_id}')
+        for unit_type in UNITS_INFO:
+            db.update_inventory(user_id, unit_type, START_UNITS)
+
+def battle_losses():
+    """Потери при победе атакующего: 30% у атакующего, все войска у защитника"""
+    attacker_inventory = db.get_inventory(ATTACKER_ID)
+    defender_inventory = db.get_inventory(DEFENDER_ID)
+    attacker_losses = {unit_type: int(attacker_inventory[unit_type] * 0.3) or 1 for unit_type in UNITS_INFO}
+    defender_losses = {unit_type: defender_inventory[unit_type] // 1000 or 1 for unit_type in UNITS_INFO}
+    return attacker_inventory, defender_inventory, attacker_losses, defender_losses
+
+def old_path():
+    attacker_inventory, defender_inventory, attacker_losses, defender_losses = battle_losses()
+    for unit_type, loss in attacker_losses.items():
+        db.update_inventory(ATTACKER_ID, unit_type, attacker_inventory[unit_type] - loss)
+    for unit_type, loss in defender_losses.items():
+        db.update_inventory(DEFENDER_ID, unit_type, defender_inventory[unit_type] - loss)
+    db.log_battle(ATTACKER_ID, DEFENDER_ID, 1000, 900,
+                  sum(attacker_losses.values()), sum(defender_losses.values()), ATTACKER_ID)
+
+def new_path():
+    _, _, attacker_losses, defender_losses = battle_losses()
+    db.resolve_battle(ATTACKER_ID, DEFENDER_ID, attacker_losses, defender_losses,
+                      1000, 900, ATTACKER_ID)
+
+def measure(func, battles):
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare(os.path.join(tmp, 'bench.db'))
+        start = time.perf_counter()
+        for _ in range(battles):
+            func()
+        elapsed = time.perf_counter() - start
+        db_pool.get_pool().close_all()
+    return battles / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--battles', type=int, default=500)
+    args = parser.parse_args()
+
+    old_rate = measure(old_path, args.battles)
+    new_rate = measure(new_path, args.battles)
+
+    print(f"Коммитов на бой: прежний путь - {len(UNITS_INFO) * 2 + 1}, resolve_battle - 1")
+    print(f"Прежний путь:   {old_rate:,.0f} боев/с")
+    print(f"resolve_battle: {new_rate:,.0f} боев/с")
+    print(f"Ускорение: x{new_rate / old_rate:.1f}")
+
+if __name__ == '__main__':
+    main()
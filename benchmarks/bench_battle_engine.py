@@ -0,0 +1,67 @@
+"""Бенчмарк движка расчета боев.
+
+Сравнивает прежний подсчет боевой мощи обходом словарей UNITS_INFO с
+armies_power над векторами армий, измеряет серию случайных боев
+count_attacker_wins и время прогноза /predict без кэша (бюджет - 50 мс).
+Показывает, используется ли NumPy.
+
+Запуск: python benchmarks/bench_battle_engine.py [--armies N] [--trials N]
+"""
+import os
+import sys
+import argparse
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import UNITS_INFO, BATTLE_PREDICT_TRIALS
+from utils import battle_engine
+from utils.battle_engine import army_from_inventory, armies_power, count_attacker_wins, predict_battle
+
+def loop_power(inventory):
+    """Прежний способ: обход инвентаря и словаря UNITS_INFO"""
+    total_power = 0
+    for unit_type, count in inventory.items():
+        if unit_type in UNITS_INFO:
+            total_power += count * UNITS_INFO[unit_type]['power']
+    return total_power
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--armies', type=int, default=100000)
+    parser.add_argument('--trials', type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    inventories = [{unit_type: rng.randrange(10 ** 6) for unit_type in UNITS_INFO}
+                   for _ in range(args.armies)]
+
+    start = time.perf_counter()
+    expected = [loop_power(inventory) for inventory in inventories]
+    loop_time = time.perf_counter() - start
+
+    armies = [army_from_inventory(inventory) for inventory in inventories]
+    start = time.perf_counter()
+    result = armies_power(armies)
+    engine_time = time.perf_counter() - start
+    assert result == expected
+
+    start = time.perf_counter()
+    wins = count_attacker_wins(1000, 900, args.trials, seed=1)
+    trials_time = time.perf_counter() - start
+
+    predict_battle.cache_clear()
+    start = time.perf_counter()
+    predict_battle(armies[0], armies[1])
+    predict_time = time.perf_counter() - start
+
+    print(f"NumPy: {'да' if battle_engine.numpy is not None else 'нет (чистый Python)'}")
+    print(f"Мощь {args.armies:,} армий: обход словарей {loop_time * 1000:.1f} мс, "
+          f"armies_power {engine_time * 1000:.1f} мс")
+    print(f"{args.trials:,} случайных боев: {trials_time * 1000:.1f} мс "
+          f"(побед атакующего: {wins / args.trials:.1%})")
+    print(f"Прогноз боя ({BATTLE_PREDICT_TRIALS:,} боев, без кэша): {predict_time * 1000:.1f} мс")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Микробенчмарк накладных расходов на соединения с базой в пределах одной команды.
+
+Сравнивает старую схему (новое соединение на каждый вызов функции db)
+с пулом соединений на примере набора запросов команды /my_country.
+Кэш состояния игроков очищается перед каждой командой, чтобы измерялись
+обращения к базе, а не попадания в кэш.
+
+Запуск: python benchmarks/bench_db_pool.py [--iterations N]
+"""
+import os
+import sys
+import sqlite3
+import argparse
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db, db_pool
+from utils.player_cache import player_cache
+from config.regions import COUNTRY_REGIONS
+
+PLAYER_ID = 1
+COUNTRY = 'Украина'
+
+class ConnectPerCallPool:
+    """Повторяет прежнее поведение: connect/close на каждый вызов"""
+
+    def __init__(self, path):
+        self.path = path
+        self.checkouts = 0
+
+    @contextmanager
+    def connection(self):
+        self.checkouts += 1
+        conn = sqlite3.connect(self.path)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+def my_country_queries():
+    """Набор запросов, который выполняет команда /my_country"""
+    player_cache.clear()
+    db.get_player_country(PLAYER_ID)
+    db.get_player_political_system(PLAYER_ID)
+    db.get_budget(PLAYER_ID)
+    inventory = db.get_inventory(PLAYER_ID)
+    factories_count = db.get_factories_count(PLAYER_ID)
+    regions = db.get_player_regions(PLAYER_ID)
+    db.get_adjusted_military_power_with_regions(PLAYER_ID, sum(inventory.values()))
+    for region_id in regions:
+        db.get_region_control_status(PLAYER_ID, region_id)
+    db.get_adjusted_production_with_regions(PLAYER_ID, factories_count * 1000)
+    db.get_player_data(PLAYER_ID)
+
+def run(pool, iterations):
+    db_pool._pool = pool
+    my_country_queries()  # прогрев
+    start_checkouts = pool.checkouts
+    start = time.perf_counter()
+    for _ in range(iterations):
+        my_country_queries()
+    elapsed = time.perf_counter() - start
+    calls = (pool.checkouts - start_checkouts) / iterations
+    return elapsed / iterations * 1000, calls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        db_pool.init_pool(path)
+        db.init_db()
+        db.create_player(PLAYER_ID, 'bench')
+        db.set_player_country(PLAYER_ID, COUNTRY)
+        db.build_factory(PLAYER_ID)
+
+        before_ms, calls = run(ConnectPerCallPool(path), args.iterations)
+        pool = db_pool.ConnectionPool(path)
+        after_ms, _ = run(pool, args.iterations)
+        pool.close_all()
+
+    print(f"Регионов: {len(COUNTRY_REGIONS[COUNTRY])}, обращений к базе на команду: {calls:.0f}")
+    print(f"Соединение на каждый вызов: {before_ms:.3f} мс на команду")
+    print(f"Пул соединений:             {after_ms:.3f} мс на команду")
+    print(f"Ускорение: x{before_ms / after_ms:.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Замер памяти кэша участников для профилей шлюза.
+
+Для каждого профиля (utils/gateway.py) в отдельном процессе создается
+клиент с соответствующими интентами и политикой кэша, и в его состояние
+загружается сервер с заданным количеством участников и их статусами, как
+после загрузки участников при запуске. Выводится прирост RSS процесса и
+объем памяти, выделенной Python, в пересчете на 10 тысяч участников.
+
+Запуск: python benchmarks/bench_gateway_memory.py [--members N]
+"""
+import os
+import sys
+import argparse
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+GUILD_ID = 1
+
+def current_rss():
+    """Текущий RSS процесса в байтах (Linux)"""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def guild_payload(members):
+    """Данные события GUILD_CREATE с участниками и их статусами"""
+    return {
+        'id': str(GUILD_ID),
+        'name': 'bench',
+        'member_count': members,
+        'roles': [],
+        'emojis': [],
+        'stickers': [],
+        'channels': [],
+        'members': [{'user': {'id': str(user_id), 'username': f'member{user_id}',
+                              'discriminator': '0', 'avatar': None},
+                     'roles': [], 'joined_at': '2024-01-01T00:00:00+00:00', 'deaf': False, 'mute': False, 'flags': 0}
+                    for user_id in range(2, members + 2)],
+        'presences': [{'user': {'id': str(user_id)}, 'status': 'online', 'activities': [],
+                       'client_status': {'desktop': 'online'}}
+                      for user_id in range(2, members + 2)],
+    }
+
+def measure(profile, members):
+    """Загружает сервер в состояние клиента и возвращает (прирост RSS, выделено Python, в кэше)"""
+    import discord
+    from utils.gateway import gateway_options
+
+    client = discord.Client(**gateway_options(profile))
+    state = client._connection
+    payload = guild_payload(members)
+
+    rss_before = current_rss()
+    tracemalloc.start()
+    guild = discord.Guild(data=payload, state=state)
+    state._add_guild(guild)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Данные события остаются живыми до замера, чтобы в прирост попал только кэш
+    rss = current_rss() - rss_before
+    del payload
+    return rss, allocated, len(guild.members)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=50000)
+    parser.add_argument('--profile', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(*measure(args.profile, args.members))
+        return
+
+    from utils.gateway import GATEWAY_PROFILES
+    scale = 10000 / args.members
+    print(f"Участников на сервере: {args.members:,}")
+    for profile in GATEWAY_PROFILES:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--members', str(args.members),
+                                 '--profile', profile], capture_output=True, text=True, check=True).stdout
+        rss, allocated, cached = map(int, output.split())
+        print(f"{profile:>5}: в кэше {cached:,} участников, RSS +{rss * scale / 2 ** 20:.1f} МиБ "
+              f"и Python {allocated * scale / 2 ** 20:.1f} МиБ на 10 тыс. участников")
+
+if __name__ == '__main__':
+    main()
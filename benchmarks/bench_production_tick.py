@@ -0,0 +1,56 @@
+"""Бенчмарк фонового начисления продукции заводов.
+
+Измеряет время settle_all_production в зависимости от количества игроков
+и сравнивает его с поочередным вызовом settle_production для каждого игрока.
+
+Запуск: python benchmarks/bench_production_tick.py [--players 100 1000 10000]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db, db_pool
+from config.political_systems import POLITICAL_SYSTEMS
+
+def prepare(path, players):
+    db_pool.init_pool(path)
+    db.init_db()
+    systems = list(POLITICAL_SYSTEMS) + [None]
+    with db_pool.transaction() as conn:
+        conn.executemany('INSERT INTO players (user_id, username, political_system) VALUES (?, ?, ?)',
+                         [(user_id, f'bench{user_id}', systems[user_id % len(systems)])
+                          for user_id in range(1, players + 1)])
+        conn.executemany('INSERT INTO production_ledger (user_id, production_rate, last_settled) VALUES (?, ?, ?)',
+                         [(user_id, 1000 * (user_id % 10 + 1), int(time.time()) - 3600)
+                          for user_id in range(1, players + 1)])
+
+def measure(players, bulk):
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare(os.path.join(tmp, 'bench.db'), players)
+        start = time.perf_counter()
+        if bulk:
+            db.settle_all_production()
+        else:
+            for user_id in range(1, players + 1):
+                db.settle_production(user_id)
+        elapsed = time.perf_counter() - start
+        db_pool.get_pool().close_all()
+    return elapsed * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, nargs='+', default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    for players in args.players:
+        bulk = measure(players, True)
+        single = measure(players, False)
+        print(f"{players:>7} игроков: settle_all_production {bulk:8.1f} мс, "
+              f"по одному {single:9.1f} мс (x{single / bulk:.1f})")
+
+if __name__ == '__main__':
+    main()
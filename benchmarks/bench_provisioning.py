@@ -0,0 +1,54 @@
+"""Бенчмарк создания игроков при добавлении бота на сервер.
+
+Сравнивает прежний путь (create_player с отдельным коммитом на каждого
+участника) с create_players, который записывает порцию участников одной
+транзакцией через executemany.
+
+Запуск: python benchmarks/bench_provisioning.py [--members N] [--chunk N]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db, db_pool
+from config.config import PLAYER_PROVISIONING_CHUNK
+
+def old_path(players, chunk):
+    for user_id, username in players:
+        db.create_player(user_id, username)
+
+def new_path(players, chunk):
+    for start in range(0, len(players), chunk):
+        db.create_players(players[start:start + chunk])
+
+def measure(func, players, chunk):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool.init_pool(os.path.join(tmp, 'bench.db'))
+        db.init_db()
+        start = time.perf_counter()
+        func(players, chunk)
+        elapsed = time.perf_counter() - start
+        db_pool.get_pool().close_all()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=10000)
+    parser.add_argument('--chunk', type=int, default=PLAYER_PROVISIONING_CHUNK)
+    args = parser.parse_args()
+
+    players = [(user_id, f'member{user_id}') for user_id in range(1, args.members + 1)]
+    old_time = measure(old_path, players, args.chunk)
+    new_time = measure(new_path, players, args.chunk)
+
+    print(f"Участников: {args.members:,}, порция: {args.chunk:,}")
+    print(f"create_player:  {old_time * 1000:,.0f} мс")
+    print(f"create_players: {new_time * 1000:,.0f} мс")
+    print(f"Ускорение: x{old_time / new_time:.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Бенчмарк подсчета суммарных эффектов регионов.
+
+Сравнивает обход всех регионов игрока с подсчетом по битовым маскам
+(summarize_region_bits) для полностью занятой Украины со случайными
+повреждениями. Маски кодируются один раз при загрузке состояния игрока,
+поэтому время кодирования показано отдельно.
+
+Запуск: python benchmarks/bench_region_effects.py [--iterations N]
+"""
+import os
+import sys
+import argparse
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.regions import (COUNTRY_REGIONS, get_region_info, encode_region_states,
+                            summarize_region_bits)
+
+COUNTRY = 'Украина'
+
+def loop_summary(country, region_states):
+    """Прежний способ: обход регионов и разбор эффектов каждого"""
+    summary = {'economy': 0.0, 'production': 0.0, 'military': 0.0, 'controlled': 0, 'damaged': 0}
+    for region_id, status in region_states.items():
+        if not status['is_controlled']:
+            continue
+        summary['controlled'] += 1
+        region_info = get_region_info(country, region_id)
+        if not region_info:
+            continue
+        if status['is_damaged']:
+            summary['damaged'] += 1
+            damage_factor = max(0.0, 1.0 - (status['damage_level'] * 0.25))
+        else:
+            damage_factor = 1.0
+        for effect_key, effect_value in region_info['effects'].items():
+            if 'production' in effect_key:
+                summary['production'] += effect_value * damage_factor
+            elif 'economy' in effect_key:
+                summary['economy'] += effect_value * damage_factor
+            elif 'military' in effect_key:
+                summary['military'] += effect_value * damage_factor
+    return summary
+
+def measure(func, region_states, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(COUNTRY, region_states)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    region_states = {}
+    for region_id in COUNTRY_REGIONS[COUNTRY]:
+        is_damaged = random.random() < 0.3
+        region_states[region_id] = {
+            'is_controlled': True,
+            'is_damaged': is_damaged,
+            'damage_level': random.randint(1, 4) if is_damaged else 0
+        }
+
+    bits = encode_region_states(COUNTRY, region_states)
+    loop_time = measure(loop_summary, region_states, args.iterations)
+    encode_time = measure(encode_region_states, region_states, args.iterations)
+    bits_time = measure(lambda country, _: summarize_region_bits(country, *bits), region_states, args.iterations)
+    print(f"Обход регионов:       {loop_time:.1f} мкс")
+    print(f"Кодирование в маски:  {encode_time:.1f} мкс")
+    print(f"Подсчет по маскам:    {bits_time:.1f} мкс")
+    print(f"Ускорение подсчета: x{loop_time / bits_time:.1f}")
+
+if __name__ == '__main__':
+    main()
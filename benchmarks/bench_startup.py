@@ -0,0 +1,88 @@
+"""Бенчмарк холодного запуска бота.
+
+Каждый запуск выполняется в новом процессе: импортируется main.py (все
+модули бота, discord.py, конфигурация), затем выполняется setup_hook на
+временной базе - миграции схемы и загрузка когов. Подключение к Discord
+не выполняется. Выводятся этапы запуска из StartupProfiler и полное время
+процесса; с --importtime дополнительно выводится сводка python -X importtime
+по пакетам.
+
+Запуск: python benchmarks/bench_startup.py [--runs N] [--budget-ms N] [--importtime]
+Код возврата 1, если медиана полного времени запуска превышает бюджет
+(STARTUP_BUDGET_MS в config/config.py).
+"""
+import os
+import sys
+import json
+import argparse
+import asyncio
+import statistics
+import subprocess
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def child(path):
+    """Запуск бота без подключения к шлюзу; печатает этапы запуска в JSON"""
+    import main
+    from utils import db_pool
+
+    db_pool.init_pool(path)
+    asyncio.run(main.setup_hook())
+    db_pool.get_pool().close_all()
+    print(json.dumps(main.startup_profiler.phases))
+
+def run_once(importtime=False):
+    """Запускает бота в новом процессе, возвращает (время процесса в мс, этапы, stderr)"""
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    with tempfile.TemporaryDirectory() as tmp:
+        command += [os.path.abspath(__file__), '--child', os.path.join(tmp, 'startup.db')]
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+        elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+def main():
+    from config.config import STARTUP_BUDGET_MS
+    from utils.startup import summarize_importtime
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument('--importtime', action='store_true', help='Показать сводку python -X importtime')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return 0
+
+    runs = [run_once() for _ in range(args.runs)]
+    totals = [elapsed for elapsed, _, _ in runs]
+    median_run = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+
+    print(f"Этапы запуска (медианный из {args.runs} запусков):")
+    for name, since_start, duration in median_run[1]:
+        print(f"  {name:<12} {since_start:>8.1f} мс  (+{duration:.1f} мс)")
+
+    if args.importtime:
+        _, _, stderr = run_once(importtime=True)
+        total, packages = summarize_importtime(stderr)
+        print(f"Импорт модулей: {total:.1f} мс, по пакетам:")
+        for package, package_ms in packages:
+            print(f"  {package:<24} {package_ms:>8.1f} мс")
+
+    median = statistics.median(totals)
+    print(f"Полное время процесса: медиана {median:.0f} мс, мин. {min(totals):.0f} мс, "
+          f"бюджет {args.budget_ms:.0f} мс")
+    if median > args.budget_ms:
+        print("Бюджет времени запуска превышен!")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,23 @@
 import discord
+import time
 from discord.ext import commands
-import random
 import logging
-from utils.db import (get_inventory, update_inventory, check_has_country, 
-                     create_player, log_battle, get_player_country)
-from config.config import UNITS_INFO
+from utils.async_db import (get_inventory, check_has_country, create_player,
+                     resolve_battle, get_player_country, get_battle_history_page,
+                     get_leaderboard_page)
+from utils.locks import player_locks
+from utils.battle_engine import (UNIT_TYPES, army_from_inventory, army_to_dict,
+                                 simulate_battle, predict_battle)
+from utils.metrics import metrics
+from config.config import UNITS_INFO, BATTLE_HISTORY_PAGE_SIZE, LEADERBOARD_PAGE_SIZE
 
 logger = logging.getLogger('vpi')
 
+def format_army(army):
+    """Список ненулевых юнитов армии для эмбеда"""
+    return ''.join(f"{UNITS_INFO[unit_type]['name']}: {count:,}\n"
+                   for unit_type, count in zip(UNIT_TYPES, army) if count > 0)
+
 # Список администраторов, имеющих доступ к админ-командам
 ADMIN_USERNAMES = ['yankeedesu', 'whymonty']
 
@@ -34,6 +44,167 @@ class CloseView(discord.ui.View):
                 # Сообщение уже удалено
                 pass
 
+# Класс для постраничного просмотра истории боев
+class BattleHistoryView(CloseView):
+    def __init__(self, ctx, player_id, battles, has_older):
+        super().__init__(ctx)
+        self.player_id = player_id
+        self.battles = battles
+        self.page = 0
+        self.has_older = has_older
+        
+        # Более новые бои
+        prev_button = discord.ui.Button(label="◀️ Новее", style=discord.ButtonStyle.secondary, custom_id="prev_page", row=0)
+        prev_button.callback = self.prev_page_callback
+        self.add_item(prev_button)
+        
+        # Более старые бои
+        next_button = discord.ui.Button(label="Старее ▶️", style=discord.ButtonStyle.secondary, custom_id="next_page", row=0)
+        next_button.callback = self.next_page_callback
+        self.add_item(next_button)
+        
+        self.update_buttons()
+    
+    def update_buttons(self):
+        for child in self.children:
+            if child.custom_id == "prev_page":
+                child.disabled = (self.page == 0)
+            elif child.custom_id == "next_page":
+                child.disabled = not self.has_older
+    
+    def build_embed(self):
+        embed = discord.Embed(
+            title=f"История боев {self.ctx.author.name}",
+            description=f"Страница {self.page + 1}",
+            color=discord.Color.purple()
+        )
+        
+        for battle in self.battles:
+            _, battle_date, attacker, defender, attacker_troops, defender_troops, \
+            attacker_losses, defender_losses, winner = battle
+            
+            battle_info = (
+                f"Дата: {battle_date}\n"
+                f"Атакующий: {attacker} ({attacker_troops:,} боевая сила)\n"
+                f"Защищающийся: {defender} ({defender_troops:,} боевая сила)\n"
+                f"Потери атакующего: {attacker_losses:,}\n"
+                f"Потери защищающегося: {defender_losses:,}\n"
+                f"Победитель: {winner}\n"
+            )
+            
+            embed.add_field(
+                name=f"Бой {battle_date}",
+                value=battle_info,
+                inline=False
+            )
+        return embed
+    
+    async def prev_page_callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.ctx.author.id:
+            await interaction.response.send_message("Эта кнопка не для вас.", ephemeral=True)
+            return
+        
+        # Курсор - самый новый бой на текущей странице
+        first = self.battles[0]
+        battles, _ = await get_battle_history_page(self.player_id, (first[1], first[0]), newer=True,
+                                                   limit=BATTLE_HISTORY_PAGE_SIZE)
+        if battles:
+            self.battles = battles
+            self.page = max(0, self.page - 1)
+            self.has_older = True
+        await self.update_page(interaction)
+    
+    async def next_page_callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.ctx.author.id:
+            await interaction.response.send_message("Эта кнопка не для вас.", ephemeral=True)
+            return
+        
+        # Курсор - самый старый бой на текущей странице
+        last = self.battles[-1]
+        battles, has_older = await get_battle_history_page(self.player_id, (last[1], last[0]),
+                                                           limit=BATTLE_HISTORY_PAGE_SIZE)
+        if battles:
+            self.battles = battles
+            self.page += 1
+        self.has_older = has_older
+        await self.update_page(interaction)
+    
+    async def update_page(self, interaction):
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+# Класс для постраничного просмотра рейтинга боевой мощи
+class LeaderboardView(CloseView):
+    def __init__(self, ctx, players, has_more):
+        super().__init__(ctx)
+        self.players = players
+        self.page = 0
+        self.has_more = has_more
+        
+        # Более сильные игроки
+        prev_button = discord.ui.Button(label="◀️ Назад", style=discord.ButtonStyle.secondary, custom_id="prev_page", row=0)
+        prev_button.callback = self.prev_page_callback
+        self.add_item(prev_button)
+        
+        # Более слабые игроки
+        next_button = discord.ui.Button(label="Вперед ▶️", style=discord.ButtonStyle.secondary, custom_id="next_page", row=0)
+        next_button.callback = self.next_page_callback
+        self.add_item(next_button)
+        
+        self.update_buttons()
+    
+    def update_buttons(self):
+        for child in self.children:
+            if child.custom_id == "prev_page":
+                child.disabled = (self.page == 0)
+            elif child.custom_id == "next_page":
+                child.disabled = not self.has_more
+    
+    def build_embed(self):
+        embed = discord.Embed(
+            title="🏆 Рейтинг боевой мощи",
+            description=f"Страница {self.page + 1}",
+            color=discord.Color.gold()
+        )
+        
+        lines = []
+        for place, (_, username, country, power) in enumerate(self.players, self.page * LEADERBOARD_PAGE_SIZE + 1):
+            lines.append(f"**{place}.** {username} ({country or 'без страны'}) - {power:,}")
+        embed.add_field(name="Игроки", value="\n".join(lines), inline=False)
+        return embed
+    
+    async def prev_page_callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.ctx.author.id:
+            await interaction.response.send_message("Эта кнопка не для вас.", ephemeral=True)
+            return
+        
+        # Курсор - самый сильный игрок на текущей странице
+        first = self.players[0]
+        players, _ = await get_leaderboard_page((first[3], first[0]), newer=True, limit=LEADERBOARD_PAGE_SIZE)
+        if players:
+            self.players = players
+            self.page = max(0, self.page - 1)
+            self.has_more = True
+        await self.update_page(interaction)
+    
+    async def next_page_callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.ctx.author.id:
+            await interaction.response.send_message("Эта кнопка не для вас.", ephemeral=True)
+            return
+        
+        # Курсор - самый слабый игрок на текущей странице
+        last = self.players[-1]
+        players, has_more = await get_leaderboard_page((last[3], last[0]), limit=LEADERBOARD_PAGE_SIZE)
+        if players:
+            self.players = players
+            self.page += 1
+        self.has_more = has_more
+        await self.update_page(interaction)
+    
+    async def update_page(self, interaction):
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
 class BattleCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -45,213 +216,172 @@ class BattleCog(commands.Cog):
     @commands.command(name='attack')
     async def attack(self, ctx, target: discord.Member):
         """Атака другого игрока"""
-        if not check_has_country(ctx.author.id):
+        if not await check_has_country(ctx.author.id):
             await ctx.send("Сначала выберите страну командой `/select_country`", ephemeral=True)
             return
             
-        if not check_has_country(target.id):
+        if not await check_has_country(target.id):
             await ctx.send("Ваша цель еще не выбрала страну!", ephemeral=True)
             return
         
         # Создаем игроков, если их нет в базе
-        create_player(ctx.author.id, ctx.author.name)
-        create_player(target.id, target.name)
+        await create_player(ctx.author.id, ctx.author.name)
+        await create_player(target.id, target.name)
         
         # Проверяем, не пытается ли игрок атаковать сам себя
         if target.id == ctx.author.id:
             await ctx.send("Вы не можете атаковать сами себя!", ephemeral=True)
             return
         
-        # Получаем инвентари атакующего и защищающегося
-        attacker_inventory = get_inventory(ctx.author.id)
-        defender_inventory = get_inventory(target.id)
-        
-        # Проверяем, есть ли у атакующего какие-либо войска
-        attacker_has_units = False
-        for unit_type in UNITS_INFO:
-            if attacker_inventory.get(unit_type, 0) > 0:
-                attacker_has_units = True
-                break
-                
-        if not attacker_has_units:
-            await ctx.send("У вас нет войск для атаки!", ephemeral=True)
-            return
+        async with player_locks.acquire(ctx.author.id, target.id):
+            # Получаем инвентари атакующего и защищающегося
+            attacker_inventory = await get_inventory(ctx.author.id)
+            defender_inventory = await get_inventory(target.id)
         
-        # Создаем эмбед для отчета о битве
-        battle_embed = discord.Embed(
-            title="⚔️ Боевой отчет ⚔️",
-            color=discord.Color.red()
-        )
-        
-        # Добавляем информацию о странах
-        attacker_country = get_player_country(ctx.author.id)
-        defender_country = get_player_country(target.id)
-        
-        battle_embed.add_field(
-            name="Противостояние",
-            value=f"{attacker_country} vs {defender_country}",
-            inline=False
-        )
+            attacker_army = army_from_inventory(attacker_inventory)
+            defender_army = army_from_inventory(defender_inventory)
         
-        # Добавляем информацию о силах сторон
-        attacker_forces = ""
-        defender_forces = ""
-        
-        # Рассчитываем общую силу атакующего
-        attacker_power = 0
-        defender_power = 0
-        
-        # Подсчитываем силы атакующего
-        for unit_type, info in UNITS_INFO.items():
-            unit_count = attacker_inventory.get(unit_type, 0)
-            if unit_count > 0:
-                attacker_forces += f"{info['name']}: {unit_count:,}\n"
-                attacker_power += unit_count * info['power']
-        
-        # Подсчитываем силы защитника
-        for unit_type, info in UNITS_INFO.items():
-            unit_count = defender_inventory.get(unit_type, 0)
-            if unit_count > 0:
-                defender_forces += f"{info['name']}: {unit_count:,}\n"
-                defender_power += unit_count * info['power']
-        
-        battle_embed.add_field(
-            name=f"Атакующий: {ctx.author.name}",
-            value=attacker_forces or "Нет войск",
-            inline=True
-        )
+            # Проверяем, есть ли у атакующего какие-либо войска
+            if not any(attacker_army):
+                await ctx.send("У вас нет войск для атаки!", ephemeral=True)
+                return
         
-        battle_embed.add_field(
-            name=f"Защищающийся: {target.name}",
-            value=defender_forces or "Нет войск",
-            inline=True
-        )
+            # Создаем эмбед для отчета о битве
+            battle_embed = discord.Embed(
+                title="⚔️ Боевой отчет ⚔️",
+                color=discord.Color.red()
+            )
         
-        # Добавляем элемент случайности (±20%)
-        attacker_random = random.uniform(0.8, 1.2)
-        defender_random = random.uniform(0.8, 1.2)
+            # Добавляем информацию о странах
+            attacker_country = await get_player_country(ctx.author.id)
+            defender_country = await get_player_country(target.id)
         
-        attacker_final = attacker_power * attacker_random
-        defender_final = defender_power * defender_random
+            battle_embed.add_field(
+                name="Противостояние",
+                value=f"{attacker_country} vs {defender_country}",
+                inline=False
+            )
         
-        # Определяем победителя
-        # Словари для хранения потерь
-        attacker_losses = {}
-        defender_losses = {}
+            # Добавляем информацию о силах сторон
+            battle_embed.add_field(
+                name=f"Атакующий: {ctx.author.name}",
+                value=format_army(attacker_army) or "Нет войск",
+                inline=True
+            )
         
-        if attacker_final > defender_final:
-            # Атакующий победил
-            # Рассчитываем потери (30% для атакующего, 100% для защитника)
-            loss_text = f"Победа {ctx.author.name}!\n\nПотери атакующего:\n"
-            
-            # Рассчитываем потери атакующего (30%)
-            for unit_type, info in UNITS_INFO.items():
-                unit_count = attacker_inventory.get(unit_type, 0)
-                if unit_count > 0:
-                    loss = int(unit_count * 0.3)  # 30% потерь
-                    attacker_losses[unit_type] = loss
-                    if loss > 0:
-                        loss_text += f"{info['name']}: {loss:,}\n"
-                        update_inventory(ctx.author.id, unit_type, unit_count - loss)
-            
-            loss_text += "\nПотери защищающегося:\n"
-            
-            # Рассчитываем потери защитника (100%)
-            for unit_type, info in UNITS_INFO.items():
-                unit_count = defender_inventory.get(unit_type, 0)
-                if unit_count > 0:
-                    defender_losses[unit_type] = unit_count  # 100% потерь
-                    loss_text += f"{info['name']}: {unit_count:,}\n"
-                    update_inventory(target.id, unit_type, 0)
-            
             battle_embed.add_field(
-                name="Результат",
-                value=loss_text,
-                inline=False
+                name=f"Защищающийся: {target.name}",
+                value=format_army(defender_army) or "Нет войск",
+                inline=True
             )
-            battle_embed.color = discord.Color.green()
-            
-            # Логируем бой
-            log_battle(ctx.author.id, target.id, attacker_power, defender_power,
-                     sum(attacker_losses.values()), sum(defender_losses.values()), ctx.author.id)
-        else:
-            # Защищающийся победил
-            # Рассчитываем потери (100% для атакующего, 30% для защитника)
-            loss_text = f"Победа {target.name}!\n\nПотери атакующего:\n"
-            
-            # Рассчитываем потери атакующего (100%)
-            for unit_type, info in UNITS_INFO.items():
-                unit_count = attacker_inventory.get(unit_type, 0)
-                if unit_count > 0:
-                    attacker_losses[unit_type] = unit_count  # 100% потерь
-                    loss_text += f"{info['name']}: {unit_count:,}\n"
-                    update_inventory(ctx.author.id, unit_type, 0)
-            
-            loss_text += "\nПотери защищающегося:\n"
-            
-            # Рассчитываем потери защитника (30%)
-            for unit_type, info in UNITS_INFO.items():
-                unit_count = defender_inventory.get(unit_type, 0)
-                if unit_count > 0:
-                    loss = int(unit_count * 0.3)  # 30% потерь
-                    defender_losses[unit_type] = loss
-                    if loss > 0:
-                        loss_text += f"{info['name']}: {loss:,}\n"
-                        update_inventory(target.id, unit_type, unit_count - loss)
-            
+        
+            # Проводим бой со случайным фактором (±20%): победитель теряет 30% войск,
+            # проигравший - все войска
+            attacker_won, attacker_losses, defender_losses, attacker_power, defender_power = \
+                simulate_battle(attacker_army, defender_army)
+        
+            if attacker_won:
+                loss_text = f"Победа {ctx.author.name}!\n\n"
+                battle_embed.color = discord.Color.green()
+                winner_id = ctx.author.id
+            else:
+                loss_text = f"Победа {target.name}!\n\n"
+                battle_embed.color = discord.Color.blue()
+                winner_id = target.id
+        
+            loss_text += f"Потери атакующего:\n{format_army(attacker_losses)}"
+            loss_text += f"\nПотери защищающегося:\n{format_army(defender_losses)}"
+        
             battle_embed.add_field(
                 name="Результат",
                 value=loss_text,
                 inline=False
             )
-            battle_embed.color = discord.Color.blue()
-            
-            # Логируем бой
-            log_battle(ctx.author.id, target.id, attacker_power, defender_power,
-                     sum(attacker_losses.values()), sum(defender_losses.values()), target.id)
+        
+            # Применяем потери и записываем бой одной транзакцией
+            await resolve_battle(ctx.author.id, target.id, army_to_dict(attacker_losses),
+                                 army_to_dict(defender_losses), attacker_power, defender_power, winner_id)
         
         # Отправляем результат боя в канал (публично)
         view = CloseView(ctx)
         message = await ctx.send(embed=battle_embed, view=view)
         view.message = message
         
+    @commands.command(name='predict')
+    async def predict(self, ctx, target: discord.Member):
+        """Прогноз исхода атаки на другого игрока"""
+        if not await check_has_country(ctx.author.id):
+            await ctx.send("Сначала выберите страну командой `/select_country`", ephemeral=True)
+            return
+            
+        if not await check_has_country(target.id):
+            await ctx.send("Ваша цель еще не выбрала страну!", ephemeral=True)
+            return
+        
+        if target.id == ctx.author.id:
+            await ctx.send("Вы не можете атаковать сами себя!", ephemeral=True)
+            return
+        
+        attacker_army = army_from_inventory(await get_inventory(ctx.author.id))
+        defender_army = army_from_inventory(await get_inventory(target.id))
+        
+        if not any(attacker_army):
+            await ctx.send("У вас нет войск для атаки!", ephemeral=True)
+            return
+        
+        start = time.perf_counter()
+        win_rate, attacker_losses, defender_losses = predict_battle(attacker_army, defender_army)
+        metrics.observe('battle.predict_ms', (time.perf_counter() - start) * 1000)
+        
+        embed = discord.Embed(
+            title="🔮 Прогноз боя",
+            description=f"{ctx.author.name} против {target.name}",
+            color=discord.Color.gold()
+        )
+        embed.add_field(
+            name="Вероятность победы",
+            value=f"{win_rate:.1%}",
+            inline=False
+        )
+        embed.add_field(
+            name="Ожидаемые потери атакующего",
+            value=format_army([round(loss) for loss in attacker_losses]) or "Нет потерь",
+            inline=True
+        )
+        embed.add_field(
+            name="Ожидаемые потери защищающегося",
+            value=format_army([round(loss) for loss in defender_losses]) or "Нет потерь",
+            inline=True
+        )
+        
+        view = CloseView(ctx)
+        message = await ctx.send(embed=embed, view=view, ephemeral=True)
+        view.message = message
+        
     @commands.command(name='history')
     async def show_history(self, ctx):
         """Показывает историю боев игрока"""
-        from utils.db import get_battle_history
-
-        battles = get_battle_history(ctx.author.id)
+        battles, has_older = await get_battle_history_page(ctx.author.id, limit=BATTLE_HISTORY_PAGE_SIZE)
         
         if not battles:
             await ctx.send("У вас пока нет истории боев!", ephemeral=True)
             return
         
-        embed = discord.Embed(
-            title=f"История боев {ctx.author.name}",
-            color=discord.Color.purple()
-        )
+        view = BattleHistoryView(ctx, ctx.author.id, battles, has_older)
+        message = await ctx.send(embed=view.build_embed(), view=view, ephemeral=True)
+        view.message = message
+    
+    @commands.command(name='leaderboard')
+    async def show_leaderboard(self, ctx):
+        """Показывает рейтинг игроков по боевой мощи"""
+        players, has_more = await get_leaderboard_page(limit=LEADERBOARD_PAGE_SIZE)
         
-        for battle in battles:
-            battle_date, attacker, defender, attacker_troops, defender_troops, \
-            attacker_losses, defender_losses, winner = battle
-            
-            battle_info = (
-                f"Дата: {battle_date}\n"
-                f"Атакующий: {attacker} ({attacker_troops:,} боевая сила)\n"
-                f"Защищающийся: {defender} ({defender_troops:,} боевая сила)\n"
-                f"Потери атакующего: {attacker_losses:,}\n"
-                f"Потери защищающегося: {defender_losses:,}\n"
-                f"Победитель: {winner}\n"
-            )
-            
-            embed.add_field(
-                name=f"Бой {battle_date}",
-                value=battle_info,
-                inline=False
-            )
+        if not players:
+            await ctx.send("В рейтинге пока нет игроков с войсками!", ephemeral=True)
+            return
         
-        view = CloseView(ctx)
-        message = await ctx.send(embed=embed, view=view, ephemeral=True)
+        view = LeaderboardView(ctx, players, has_more)
+        message = await ctx.send(embed=view.build_embed(), view=view, ephemeral=True)
         view.message = message
 
 async def setup(bot):
@@ -1,12 +1,12 @@
 import discord
 from discord.ext import commands
 import logging
-from utils.db import (get_player_country, set_player_country, create_player, check_has_country, 
-                     get_player_political_system, get_budget, get_inventory, get_factories_count, 
+from utils.async_db import (get_player_country, set_player_country, create_player, check_has_country, 
                      get_player_data, get_adjusted_military_power, calculate_production,
-                     get_player_regions, get_region_control_status, get_adjusted_military_power_with_regions,
-                     get_adjusted_production_with_regions, get_player_controlled_regions)
+                     get_player_regions, get_adjusted_military_power_with_regions,
+                     get_adjusted_production_with_regions, get_player_state)
 from config.config import AVAILABLE_COUNTRIES, UNITS_INFO, FACTORY_PRODUCTION_RATE
+from utils.battle_engine import army_from_inventory, army_power
 from config.political_systems import get_political_system_emoji_and_name, get_political_system_info, format_effect, get_political_system_effects
 from config.regions import get_region_info, format_effect as region_format_effect, COUNTRY_REGIONS
 
@@ -51,22 +51,23 @@ class CountryView(CloseView):
             await interaction.response.send_message("Эта кнопка не для вас.", ephemeral=True)
             return
         
-        # Получаем список регионов игрока
-        regions = get_player_regions(self.player_id)
+        # Получаем состояние всех регионов игрока одним запросом
+        state = await get_player_state(self.player_id)
         
-        if not regions:
+        if not state.regions:
             await interaction.response.send_message(
                 f"У вас нет контролируемых регионов в стране {self.country}.",
                 ephemeral=True
             )
             return
         
-        # Получаем детальную информацию о регионах
-        regions_details = get_player_controlled_regions(self.player_id)
-        
         # Обрабатываем все регионы
         processed_regions = []
-        for region_id, is_damaged, damage_level in regions_details:
+        for region_id, region_state in state.region_states.items():
+            if not region_state['is_controlled']:
+                continue
+            is_damaged = region_state['is_damaged']
+            damage_level = region_state['damage_level']
             region_info = get_region_info(self.country, region_id)
             if not region_info:
                 continue
@@ -239,7 +240,7 @@ class CountryCog(commands.Cog):
     async def select_country(self, ctx, country: str = None):
         """Выбор страны для игры"""
         # Проверяем, есть ли у игрока уже выбранная страна
-        current_country = get_player_country(ctx.author.id)
+        current_country = await get_player_country(ctx.author.id)
         if current_country:
             embed = discord.Embed(
                 title="Ошибка выбора страны",
@@ -284,10 +285,10 @@ class CountryCog(commands.Cog):
             return
 
         # Создаем игрока, если его нет в базе
-        create_player(ctx.author.id, ctx.author.name)
+        await create_player(ctx.author.id, ctx.author.name)
         
         # Устанавливаем страну
-        set_player_country(ctx.author.id, country)
+        await set_player_country(ctx.author.id, country)
         
         embed = discord.Embed(
             title="Страна выбрана!",
@@ -296,7 +297,7 @@ class CountryCog(commands.Cog):
         )
         
         # Получаем регионы игрока
-        regions = get_player_regions(ctx.author.id)
+        regions = await get_player_regions(ctx.author.id)
         controlled_regions_count = len(regions) if regions else 0
         
         if controlled_regions_count > 0:
@@ -334,10 +335,10 @@ class CountryCog(commands.Cog):
             return
         
         # Создаем игрока, если его нет в базе
-        create_player(target.id, target.name)
+        await create_player(target.id, target.name)
         
         # Устанавливаем страну
-        set_player_country(target.id, country)
+        await set_player_country(target.id, country)
         
         embed = discord.Embed(
             title="Страна назначена администратором",
@@ -346,7 +347,7 @@ class CountryCog(commands.Cog):
         )
         
         # Получаем регионы игрока
-        regions = get_player_regions(target.id)
+        regions = await get_player_regions(target.id)
         controlled_regions_count = len(regions) if regions else 0
         
         if controlled_regions_count > 0:
@@ -383,10 +384,10 @@ class CountryCog(commands.Cog):
             return
         
         # Создаем игрока, если его нет в базе
-        create_player(target.id, target.name)
+        await create_player(target.id, target.name)
         
         # Сбрасываем страну игрока
-        set_player_country(target.id, None)
+        await set_player_country(target.id, None)
         
         embed = discord.Embed(
             title="Сброс страны",
@@ -416,7 +417,9 @@ class CountryCog(commands.Cog):
     async def show_country(self, ctx):
         """Показывает информацию о стране игрока"""
         player_id = ctx.author.id
-        country = get_player_country(player_id)
+        # Все основные данные игрока загружаются одним запросом (или берутся из кэша)
+        state = await get_player_state(player_id)
+        country = state.country
         
         if not country:
             await ctx.send(
@@ -426,26 +429,22 @@ class CountryCog(commands.Cog):
             return
         
         # Получаем политическую систему
-        political_system = get_player_political_system(player_id)
+        political_system = state.political_system
         
         # Получаем статистику игрока
-        budget = get_budget(player_id)
-        inventory = get_inventory(player_id)
-        factories_count = get_factories_count(player_id)
+        budget = state.budget
+        inventory = state.inventory
+        factories_count = state.factories_count
         
         # Получаем информацию о регионах игрока
-        regions = get_player_regions(player_id)
+        regions = state.regions
         controlled_regions_count = len(regions) if regions else 0
         
         # Рассчитываем боевую мощь
-        total_power = 0
-        for unit_type, count in inventory.items():
-            if unit_type in UNITS_INFO:
-                unit_power = count * UNITS_INFO[unit_type]['power']
-                total_power += unit_power
+        total_power = army_power(army_from_inventory(inventory))
         
         # Применяем модификатор боевой мощи от политической системы и регионов
-        total_power = get_adjusted_military_power_with_regions(player_id, total_power)
+        total_power = await get_adjusted_military_power_with_regions(player_id, total_power)
         
         # Создаем красивый эмбед для отображения информации о стране
         embed = discord.Embed(
@@ -492,35 +491,15 @@ class CountryCog(commands.Cog):
         
         # Добавляем информацию о регионах
         if controlled_regions_count > 0:
-            # Получаем список поврежденных регионов
-            damaged_regions_count = 0
+            # Суммарные эффекты регионов с учетом повреждений уже посчитаны при загрузке состояния
+            region_effects = state.region_effects
+            damaged_regions_count = region_effects['damaged']
             regions_effects = {
-                'economy': 0.0,
-                'production': 0.0,
-                'military': 0.0
+                'economy': region_effects['economy'],
+                'production': region_effects['production'],
+                'military': region_effects['military']
             }
             
-            # Суммируем эффекты от всех регионов
-            for region_id in regions:
-                region_info = get_region_info(country, region_id)
-                if region_info:
-                    # Проверяем, поврежден ли регион
-                    region_status = get_region_control_status(player_id, region_id)
-                    if region_status and region_status['is_damaged']:
-                        damaged_regions_count += 1
-                        damage_factor = max(0.0, 1.0 - (region_status['damage_level'] * 0.25))
-                    else:
-                        damage_factor = 1.0
-                    
-                    # Добавляем эффекты региона с учетом повреждений
-                    for effect_key, effect_value in region_info['effects'].items():
-                        if 'production' in effect_key:
-                            regions_effects['production'] += effect_value * damage_factor
-                        elif 'economy' in effect_key:
-                            regions_effects['economy'] += effect_value * damage_factor
-                        elif 'military' in effect_key:
-                            regions_effects['military'] += effect_value * damage_factor
-            
             # Форматируем эффекты регионов для отображения
             regions_text = f"Контролируемые регионы: {controlled_regions_count}/{len(COUNTRY_REGIONS.get(country, {}))}\n"
             if damaged_regions_count > 0:
@@ -570,7 +549,7 @@ class CountryCog(commands.Cog):
             production_text += f"Базовое производство: {base_production} ед./час\n"
             
             # Бонусы от политической системы и регионов
-            adjusted_production = get_adjusted_production_with_regions(player_id, base_production)
+            adjusted_production = await get_adjusted_production_with_regions(player_id, base_production)
             
             if adjusted_production != base_production:
                 bonus_percent = ((adjusted_production / base_production) - 1.0) * 100
@@ -612,7 +591,7 @@ class CountryCog(commands.Cog):
         )
         
         # Добавляем футер с дополнительной информацией
-        player_data = get_player_data(player_id)
+        player_data = await get_player_data(player_id)
         if player_data and player_data[4]:  # Индекс 4 - created_at
             created_at = player_data[4]
             embed.set_footer(text=f"Страна основана: {created_at}")
@@ -752,12 +731,24 @@ class CountryCog(commands.Cog):
             inline=False
         )
         
+        battle_embed.add_field(
+            name="/predict @игрок",
+            value="Оценить вероятность победы и ожидаемые потери при атаке на игрока.",
+            inline=False
+        )
+        
         battle_embed.add_field(
             name="/history",
             value="Показать историю ваших боев.",
             inline=False
         )
         
+        battle_embed.add_field(
+            name="/leaderboard",
+            value="Показать рейтинг игроков по боевой мощи.",
+            inline=False
+        )
+        
         # Создаем эмбед для раздела Администрирование (только для админов)
         admin_embed = None
         if is_admin:
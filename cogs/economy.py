@@ -1,11 +1,14 @@
 import discord
 from discord.ext import commands
 import logging
-from utils.db import (get_budget, update_budget, get_inventory, update_inventory, 
-                     check_has_country, create_player, get_factories_count, build_factory,
-                     calculate_production, get_player_country, get_player_political_system)
+from utils.async_db import (get_budget, update_budget, add_budget, get_inventory, add_inventory, 
+                     check_has_country, create_player, get_factories_count, purchase_factory,
+                     settle_production, get_player_country, get_player_political_system,
+                     purchase_units)
+from utils.locks import player_locks
 from config.config import (FACTORY_COST, FACTORY_PRODUCTION_RATE, UNITS_INFO)
-from config.political_systems import get_political_system_info, get_political_system_effects, format_effect
+from utils.battle_engine import army_from_inventory, army_power
+from config.political_systems import get_political_system_info, get_political_modifiers, PRODUCTION, format_effect
 
 logger = logging.getLogger('vpi')
 
@@ -60,12 +63,10 @@ class EconomyCog(commands.Cog):
             return
         
         # Создаем игрока, если его нет в базе
-        create_player(target.id, target.name)
+        await create_player(target.id, target.name)
         
-        # Получаем текущий бюджет и обновляем его
-        current_budget = get_budget(target.id)
-        new_budget = current_budget + amount
-        update_budget(target.id, new_budget)
+        async with player_locks.acquire(target.id):
+            new_budget = await add_budget(target.id, amount)
         
         embed = discord.Embed(
             title="💸 Выдача средств",
@@ -116,10 +117,11 @@ class EconomyCog(commands.Cog):
             return
         
         # Создаем игрока, если его нет в базе
-        create_player(target.id, target.name)
+        await create_player(target.id, target.name)
         
-        # Устанавливаем новый бюджет
-        update_budget(target.id, amount)
+        async with player_locks.acquire(target.id):
+            # Устанавливаем новый бюджет
+            await update_budget(target.id, amount)
         
         embed = discord.Embed(
             title="💰 Установка бюджета",
@@ -203,12 +205,12 @@ class EconomyCog(commands.Cog):
     async def buy_menu(self, ctx):
         """Открывает меню покупки военной техники"""
         # Проверяем, выбрана ли страна
-        if not check_has_country(ctx.author.id):
+        if not await check_has_country(ctx.author.id):
             await ctx.send("Сначала выберите страну командой `/select_country`", ephemeral=True)
             return
             
         # Создаем игрока, если его нет в базе
-        create_player(ctx.author.id, ctx.author.name)
+        await create_player(ctx.author.id, ctx.author.name)
         
         embed = discord.Embed(
             title="Меню покупки военной техники",
@@ -237,7 +239,7 @@ class EconomyCog(commands.Cog):
         )
         
         # Добавляем информацию о текущем бюджете
-        budget = get_budget(ctx.author.id)
+        budget = await get_budget(ctx.author.id)
         embed.add_field(
             name="Ваш бюджет",
             value=f"{budget:,}$",
@@ -263,40 +265,27 @@ class EconomyCog(commands.Cog):
         unit_info = UNITS_INFO[unit_type]
 
         # Проверяем, выбрана ли страна
-        if not check_has_country(ctx.author.id):
+        if not await check_has_country(ctx.author.id):
             await ctx.send("Сначала выберите страну командой `/select_country`", ephemeral=True)
             return
 
-        # Проверяем бюджет
-        budget = get_budget(ctx.author.id)
-        total_cost = amount * unit_info['cost']
+        async with player_locks.acquire(ctx.author.id):
+            # Проверяем ресурсы и покупаем юниты в одной транзакции
+            result = await purchase_units(ctx.author.id, unit_type, amount)
+        total_cost = result['total_cost']
+        required_ammo = result['required_ammo']
 
-        if budget < total_cost:
-            await ctx.send(f"Недостаточно средств. Требуется: {total_cost:,}$, у вас: {budget:,}$", ephemeral=True)
+        if result['reason'] == 'budget':
+            await ctx.send(f"Недостаточно средств. Требуется: {total_cost:,}$, у вас: {result['budget']:,}$", ephemeral=True)
             return
 
-        # Проверяем наличие пехотного вооружения
-        inventory = get_inventory(ctx.author.id)
-        current_ammo = inventory.get('ammo', 0)
-        required_ammo = amount * unit_info['ammo']
-
-        if current_ammo < required_ammo:
+        if result['reason'] == 'ammo':
             await ctx.send(
-                f"Недостаточно пехотного вооружения. Требуется: {required_ammo:,}, у вас: {current_ammo:,}",
+                f"Недостаточно пехотного вооружения. Требуется: {required_ammo:,}, у вас: {result['ammo']:,}",
                 ephemeral=True
             )
             return
 
-        # Обновляем бюджет и инвентарь
-        update_budget(ctx.author.id, budget - total_cost)
-        
-        # Обновляем количество юнитов
-        current_units = inventory.get(unit_type, 0)
-        update_inventory(ctx.author.id, unit_type, current_units + amount)
-        
-        # Уменьшаем количество пехотного вооружения
-        update_inventory(ctx.author.id, 'ammo', current_ammo - required_ammo)
-
         embed = discord.Embed(
             title=f"Покупка {unit_info['name']}",
             description=f"Куплено {unit_info['name']}: {amount}\n"
@@ -348,21 +337,18 @@ class EconomyCog(commands.Cog):
     async def build_factory_cmd(self, ctx):
         """Построить военный завод"""
         # Проверяем, выбрана ли страна
-        if not check_has_country(ctx.author.id):
+        if not await check_has_country(ctx.author.id):
             await ctx.send("Сначала выберите страну командой `/select_country`", ephemeral=True)
             return
 
-        # Проверяем бюджет
-        budget = get_budget(ctx.author.id)
-        if budget < FACTORY_COST:
-            await ctx.send(f"Недостаточно средств. Требуется: {FACTORY_COST:,}$, у вас: {budget:,}$", ephemeral=True)
-            return
-
-        # Строим завод
-        build_factory(ctx.author.id)
-        update_budget(ctx.author.id, budget - FACTORY_COST)
+        async with player_locks.acquire(ctx.author.id):
+            # Списываем стоимость и строим завод одной транзакцией
+            result = await purchase_factory(ctx.author.id)
+            if not result['success']:
+                await ctx.send(f"Недостаточно средств. Требуется: {FACTORY_COST:,}$, у вас: {result['budget']:,}$", ephemeral=True)
+                return
 
-        factories_count = get_factories_count(ctx.author.id)
+        factories_count = await get_factories_count(ctx.author.id)
         
         embed = discord.Embed(
             title="Военный завод пехотного вооружения построен!",
@@ -378,24 +364,23 @@ class EconomyCog(commands.Cog):
     async def show_factories(self, ctx):
         """Показать информацию о ваших заводах"""
         # Проверяем, выбрана ли страна
-        if not check_has_country(ctx.author.id):
+        if not await check_has_country(ctx.author.id):
             await ctx.send("Сначала выберите страну командой `/select_country`", ephemeral=True)
             return
 
-        factories_count = get_factories_count(ctx.author.id)
+        factories_count = await get_factories_count(ctx.author.id)
         if factories_count == 0:
             await ctx.send("У вас пока нет военных заводов. Используйте команду `/build_factory` для постройки.", ephemeral=True)
             return
             
-        production = calculate_production(ctx.author.id)
-        
-        # Добавляем произведенные единицы пехотного вооружения в инвентарь
-        inventory = get_inventory(ctx.author.id)
-        current_ammo = inventory.get('ammo', 0)
-        update_inventory(ctx.author.id, 'ammo', current_ammo + production)
+        async with player_locks.acquire(ctx.author.id):
+            # Добавляем произведенные единицы пехотного вооружения в инвентарь
+            production = await settle_production(ctx.author.id)
+            # Запас читается после зачисления и уже включает произведенное
+            inventory = await get_inventory(ctx.author.id)
         
         # Получаем политическую систему для отображения бонусов
-        political_system = get_player_political_system(ctx.author.id)
+        political_system = await get_player_political_system(ctx.author.id)
         
         embed = discord.Embed(
             title="Ваши военные заводы пехотного вооружения",
@@ -415,12 +400,7 @@ class EconomyCog(commands.Cog):
         # Если есть политическая система, показываем бонус
         if political_system:
             system_info = get_political_system_info(political_system)
-            effects = get_political_system_effects(political_system)
-            
-            production_modifier = 0
-            for key, value in effects.items():
-                if 'production' in key:
-                    production_modifier += value
+            production_modifier = get_political_modifiers(political_system)[PRODUCTION]
             
             if production_modifier != 0:
                 adjusted_production = int(base_production * (1 + production_modifier))
@@ -436,7 +416,7 @@ class EconomyCog(commands.Cog):
         embed.add_field(
             name="Результаты производства",
             value=f"Произведено с последней проверки: {production:,} единиц пехотного вооружения\n"
-                  f"Текущий запас: {inventory.get('ammo', 0) + production:,} единиц",
+                  f"Текущий запас: {inventory.get('ammo', 0):,} единиц",
             inline=False
         )
         
@@ -447,13 +427,13 @@ class EconomyCog(commands.Cog):
     @commands.command(name='inventory')
     async def show_inventory(self, ctx):
         """Показать инвентарь игрока"""
-        if not check_has_country(ctx.author.id):
+        if not await check_has_country(ctx.author.id):
             await ctx.send("Сначала выберите страну командой `/select_country`", ephemeral=True)
             return
 
-        inventory = get_inventory(ctx.author.id)
-        budget = get_budget(ctx.author.id)
-        country = get_player_country(ctx.author.id)
+        inventory = await get_inventory(ctx.author.id)
+        budget = await get_budget(ctx.author.id)
+        country = await get_player_country(ctx.author.id)
         
         embed = discord.Embed(
             title=f"Инвентарь | {ctx.author.name} | {country}",
@@ -482,7 +462,7 @@ class EconomyCog(commands.Cog):
             inline=True
         )
         
-        factories_count = get_factories_count(ctx.author.id)
+        factories_count = await get_factories_count(ctx.author.id)
         if factories_count > 0:
             production_rate = factories_count * FACTORY_PRODUCTION_RATE
             embed.add_field(
@@ -492,10 +472,7 @@ class EconomyCog(commands.Cog):
             )
         
         # Добавляем информацию о боевой мощи
-        total_power = 0
-        for unit_type, count in inventory.items():
-            if unit_type in UNITS_INFO:
-                total_power += count * UNITS_INFO[unit_type]['power']
+        total_power = army_power(army_from_inventory(inventory))
         
         embed.add_field(
             name="Общая боевая мощь",
@@ -520,13 +497,10 @@ class EconomyCog(commands.Cog):
             return
         
         # Создаем игрока, если его нет в базе
-        create_player(target.id, target.name)
+        await create_player(target.id, target.name)
         
-        # Получаем текущий инвентарь и обновляем его
-        inventory = get_inventory(target.id)
-        current_ammo = inventory.get('ammo', 0)
-        new_ammo = current_ammo + amount
-        update_inventory(target.id, 'ammo', new_ammo)
+        async with player_locks.acquire(target.id):
+            new_ammo = await add_inventory(target.id, 'ammo', amount)
         
         admin_embed = discord.Embed(
             title=f"✅ Выдано пехотное вооружение",
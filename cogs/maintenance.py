@@ -0,0 +1,246 @@
+import discord
+from discord.ext import commands, tasks
+import logging
+import math
+import time
+from utils.metrics import metrics
+from utils.db_pool import get_pool
+from utils.player_cache import player_cache
+from utils.gateway import is_primary_process
+from utils.async_db import checkpoint, get_storage_stats, settle_all_production, archive_battles
+from config.config import (DB_CHECKPOINT_INTERVAL, PRODUCTION_TICK_ENABLED,
+                           PRODUCTION_TICK_INTERVAL, PRODUCTION_TICK_DRY_RUN,
+                           BATTLE_ARCHIVE_ENABLED, BATTLE_ARCHIVE_AGE_DAYS, BATTLE_ARCHIVE_INTERVAL,
+                           SHARD_METRICS_INTERVAL)
+
+logger = logging.getLogger('vpi')
+
+# Список администраторов, имеющих доступ к админ-командам
+ADMIN_USERNAMES = ['yankeedesu', 'whymonty']
+
+# Базовый класс с кнопкой закрытия
+class CloseView(discord.ui.View):
+    def __init__(self, ctx):
+        super().__init__(timeout=120)  # 2 минуты таймаут
+        self.ctx = ctx
+        self.message = None
+
+    @discord.ui.button(label="❌ Закрыть", style=discord.ButtonStyle.red, custom_id="close", row=1)
+    async def close_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if interaction.user.id != self.ctx.author.id:
+            await interaction.response.send_message("Эта кнопка не для вас.", ephemeral=True)
+            return
+        await interaction.message.delete()
+
+    async def on_timeout(self):
+        # Автоматическое удаление сообщения после истечения таймаута
+        if self.message:
+            try:
+                await self.message.delete()
+            except discord.NotFound:
+                # Сообщение уже удалено
+                pass
+
+class MaintenanceCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        # Количество сообщений по шардам на момент прошлого замера
+        self.shard_messages = {}
+        self.shard_metrics_task.change_interval(seconds=SHARD_METRICS_INTERVAL)
+        self.shard_metrics_task.start()
+
+        # Когда шарды работают в нескольких процессах с общей базой, фоновые
+        # задачи выполняет только один из них
+        if not is_primary_process(bot):
+            logger.info("Фоновые задачи обслуживания выполняет процесс с шардом 0")
+            return
+        self.checkpoint_task.change_interval(seconds=DB_CHECKPOINT_INTERVAL)
+        self.checkpoint_task.start()
+        if PRODUCTION_TICK_ENABLED:
+            self.production_task.change_interval(seconds=PRODUCTION_TICK_INTERVAL)
+            self.production_task.start()
+        if BATTLE_ARCHIVE_ENABLED:
+            self.archive_task.change_interval(seconds=BATTLE_ARCHIVE_INTERVAL)
+            self.archive_task.start()
+
+    def cog_unload(self):
+        self.shard_metrics_task.cancel()
+        self.checkpoint_task.cancel()
+        self.production_task.cancel()
+        self.archive_task.cancel()
+
+    def get_latencies(self):
+        """Задержка шлюза по шардам: список (номер шарда, секунды)"""
+        if isinstance(self.bot, commands.AutoShardedBot):
+            return self.bot.latencies
+        return [(self.bot.shard_id or 0, self.bot.latency)]
+
+    @commands.Cog.listener()
+    async def on_socket_event_type(self, event_type):
+        metrics.increment('gateway.events')
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        # Личные сообщения всегда приходят через шард 0
+        shard_id = message.guild.shard_id if message.guild else 0
+        metrics.increment(f'gateway.shard.{shard_id}.messages')
+
+    @tasks.loop(seconds=60)
+    async def shard_metrics_task(self):
+        """Периодический замер задержки шлюза и частоты сообщений по шардам"""
+        for shard_id, latency in self.get_latencies():
+            # До подключения шарда задержка не определена
+            if math.isfinite(latency):
+                metrics.observe(f'gateway.shard.{shard_id}.latency_ms', latency * 1000)
+
+        counters = metrics.snapshot()['counters']
+        minutes = self.shard_metrics_task.seconds / 60
+        for name, count in counters.items():
+            if name.startswith('gateway.shard.') and name.endswith('.messages'):
+                rate = (count - self.shard_messages.get(name, 0)) / minutes
+                metrics.observe(name + '_per_min', rate)
+                self.shard_messages[name] = count
+        events = counters.get('gateway.events', 0)
+        metrics.observe('gateway.events_per_min', (events - self.shard_messages.get('gateway.events', 0)) / minutes)
+        self.shard_messages['gateway.events'] = events
+
+    @tasks.loop(seconds=300)
+    async def checkpoint_task(self):
+        """Периодический пассивный чекпоинт WAL: не блокирует читателей и писателей"""
+        start = time.perf_counter()
+        try:
+            busy, wal_pages, checkpointed_pages = await checkpoint('PASSIVE')
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении чекпоинта WAL: {e}")
+            return
+        metrics.observe('db.checkpoint_ms', (time.perf_counter() - start) * 1000)
+        stats = await get_storage_stats()
+        metrics.observe('db.wal_size_kb', stats['wal_size'] / 1024)
+        if busy or checkpointed_pages < wal_pages:
+            logger.info(f"Чекпоинт WAL выполнен частично: {checkpointed_pages}/{wal_pages} страниц")
+
+    @tasks.loop(seconds=600)
+    async def production_task(self):
+        """Периодическое начисление продукции заводов всем игрокам"""
+        start = time.perf_counter()
+        try:
+            result = await settle_all_production(dry_run=PRODUCTION_TICK_DRY_RUN)
+        except Exception as e:
+            logger.error(f"Ошибка при начислении продукции заводов: {e}")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        metrics.observe('production.tick_ms', elapsed)
+        metrics.observe('production.tick_players', result['players'])
+        if PRODUCTION_TICK_DRY_RUN:
+            logger.info(f"Начисление продукции (пробный запуск): {result['players']} игроков, "
+                        f"{result['produced']:,} единиц, {elapsed:.1f} мс")
+        else:
+            metrics.increment('production.produced', result['produced'])
+
+    @tasks.loop(seconds=3600)
+    async def archive_task(self):
+        """Периодический перенос старых боев в архив"""
+        start = time.perf_counter()
+        try:
+            archived = await archive_battles(BATTLE_ARCHIVE_AGE_DAYS)
+        except Exception as e:
+            logger.error(f"Ошибка при архивации истории боев: {e}")
+            return
+        metrics.observe('db.archive_ms', (time.perf_counter() - start) * 1000)
+        metrics.increment('db.archived_battles', archived)
+
+    async def is_admin(self, ctx):
+        """Проверка, является ли пользователь администратором"""
+        return ctx.author.name.lower() in [name.lower() for name in ADMIN_USERNAMES]
+
+    @commands.command(name='admin_metrics')
+    async def admin_metrics(self, ctx):
+        """[ADMIN] Показать метрики производительности бота"""
+        if not await self.is_admin(ctx):
+            await ctx.send("У вас нет прав для использования этой команды.", ephemeral=True)
+            return
+
+        snapshot = metrics.snapshot()
+
+        embed = discord.Embed(
+            title="📈 Метрики производительности",
+            color=discord.Color.dark_grey()
+        )
+
+        # Время блокировки цикла событий по командам
+        blocked_lines = []
+        for name, timing in sorted(snapshot['timings'].items()):
+            if name.startswith('command.') and name.endswith('.loop_blocked_ms'):
+                command_name = name[len('command.'):-len('.loop_blocked_ms')]
+                blocked_lines.append(
+                    f"`{command_name}`: ср. {timing['avg']:.1f} мс, p95 {timing['p95']:.1f} мс, "
+                    f"макс. {timing['max']:.1f} мс ({timing['count']})"
+                )
+        embed.add_field(
+            name="Блокировка цикла событий по командам",
+            value=("\n".join(blocked_lines[:20]) or "Нет данных")[:1024],
+            inline=False
+        )
+
+        # Прочие замеры
+        other_lines = []
+        for name, timing in sorted(snapshot['timings'].items()):
+            if not name.startswith('command.'):
+                other_lines.append(
+                    f"`{name}`: ср. {timing['avg']:.2f}, p95 {timing['p95']:.2f}, "
+                    f"макс. {timing['max']:.2f} ({timing['count']})"
+                )
+        embed.add_field(
+            name="Замеры",
+            value=("\n".join(other_lines[:20]) or "Нет данных")[:1024],
+            inline=False
+        )
+
+        counters = [f"`{name}`: {value:,}" for name, value in sorted(snapshot['counters'].items())]
+        embed.add_field(
+            name="Счетчики",
+            value=("\n".join(counters[:20]) or "Нет данных")[:1024],
+            inline=False
+        )
+
+        pool_stats = get_pool().stats()
+        embed.add_field(
+            name="Пул соединений",
+            value=f"Размер: {pool_stats['size']}, открыто: {pool_stats['created']}, "
+                  f"свободно: {pool_stats['idle']}, выдач: {pool_stats['checkouts']:,}",
+            inline=False
+        )
+
+        hits = snapshot['counters'].get('cache.player_state.hits', 0)
+        misses = snapshot['counters'].get('cache.player_state.misses', 0)
+        hit_rate = hits / (hits + misses) * 100 if hits + misses else 0
+        embed.add_field(
+            name="Кэш игроков",
+            value=f"Записей: {len(player_cache)}/{player_cache.max_size}, попаданий: {hit_rate:.1f}%",
+            inline=False
+        )
+
+        shard_lines = [f"Шард {shard_id}: {latency * 1000:.0f} мс" if math.isfinite(latency)
+                       else f"Шард {shard_id}: не подключен"
+                       for shard_id, latency in self.get_latencies()]
+        embed.add_field(
+            name="Задержка шлюза",
+            value="\n".join(shard_lines)[:1024],
+            inline=False
+        )
+
+        storage_stats = await get_storage_stats()
+        embed.add_field(
+            name="Хранилище",
+            value=f"Режим журнала: {storage_stats['journal_mode']}, synchronous: {storage_stats['synchronous']}\n"
+                  f"Размер базы: {storage_stats['db_size'] / 1024:,.0f} КиБ, "
+                  f"размер WAL: {storage_stats['wal_size'] / 1024:,.0f} КиБ",
+            inline=False
+        )
+
+        view = CloseView(ctx)
+        message = await ctx.send(embed=embed, view=view, ephemeral=True)
+        view.message = message
+
+async def setup(bot):
+    await bot.add_cog(MaintenanceCog(bot))
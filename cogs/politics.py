@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands
 import logging
-from utils.db import (check_has_country, create_player, get_player_country, 
+from utils.async_db import (check_has_country, create_player, get_player_country, 
                      get_player_political_system, set_player_political_system,
                      get_player_data)
 from config.political_systems import (POLITICAL_SYSTEMS, get_political_system_info, 
@@ -131,15 +131,15 @@ class PoliticsCog(commands.Cog):
             return
         
         # Проверяем, выбрана ли страна
-        if not check_has_country(target.id):
+        if not await check_has_country(target.id):
             await ctx.send(f"У {target.name} не выбрана страна.", ephemeral=True)
             return
         
-        country = get_player_country(target.id)
+        country = await get_player_country(target.id)
         
         # Если system_id не указан, показываем текущую систему и список доступных
         if not system_id:
-            current_system = get_player_political_system(target.id)
+            current_system = await get_player_political_system(target.id)
             
             embed = discord.Embed(
                 title=f"Политическая система | {target.name} | {country}",
@@ -167,7 +167,7 @@ class PoliticsCog(commands.Cog):
             return
         
         # Устанавливаем политическую систему
-        set_player_political_system(target.id, system_id)
+        await set_player_political_system(target.id, system_id)
         
         system_info = get_political_system_info(system_id)
         
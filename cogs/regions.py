@@ -1,8 +1,8 @@
 import discord
 from discord.ext import commands
 import logging
-from utils.db import (check_has_country, get_player_country, get_player_regions,
-                     get_player_controlled_regions, get_region_control_status,
+from utils.async_db import (check_has_country, get_player_country, get_player_regions,
+                     get_player_state, get_region_control_status,
                      change_region_control, set_region_damage, repair_region,
                      get_adjusted_economic_bonus, get_player_data)
 from config.regions import (COUNTRY_REGIONS, get_region_info, get_region_name,
@@ -47,21 +47,21 @@ class RegionCog(commands.Cog):
     @commands.command(name='regions')
     async def show_regions(self, ctx):
         """Показать информацию о регионах игрока"""
+        # Страна и состояние всех регионов игрока загружаются одним запросом
+        state = await get_player_state(ctx.author.id)
+        
         # Проверяем, выбрал ли игрок страну
-        if not check_has_country(ctx.author.id):
+        if not state.country:
             await ctx.send("Сначала выберите страну командой `/select_country`", ephemeral=True)
             return
         
-        country = get_player_country(ctx.author.id)
-        regions = get_player_regions(ctx.author.id)
+        country = state.country
+        regions = state.regions
         
         if not regions:
             await ctx.send(f"У вас нет контролируемых регионов в стране {country}.", ephemeral=True)
             return
         
-        # Получаем детальную информацию о регионах
-        regions_details = get_player_controlled_regions(ctx.author.id)
-        
         # Формируем эмбед с информацией
         embed = discord.Embed(
             title=f"Регионы страны {country}",
@@ -73,7 +73,11 @@ class RegionCog(commands.Cog):
         normal_regions = []
         damaged_regions = []
         
-        for region_id, is_damaged, damage_level in regions_details:
+        for region_id, region_state in state.region_states.items():
+            if not region_state['is_controlled']:
+                continue
+            is_damaged = region_state['is_damaged']
+            damage_level = region_state['damage_level']
             region_info = get_region_info(country, region_id)
             if not region_info:
                 continue
@@ -118,7 +122,7 @@ class RegionCog(commands.Cog):
             )
         
         # Общие бонусы от всех регионов
-        econ_bonus = get_adjusted_economic_bonus(ctx.author.id)
+        econ_bonus = await get_adjusted_economic_bonus(ctx.author.id)
         embed.add_field(
             name="📊 Общий бонус от всех регионов и политической системы",
             value=f"Экономика: {format_effect(econ_bonus)}",
@@ -134,15 +138,15 @@ class RegionCog(commands.Cog):
     async def view_region(self, ctx, region_id: str = None):
         """Просмотреть детальную информацию о регионе"""
         # Проверяем, выбрал ли игрок страну
-        if not check_has_country(ctx.author.id):
+        if not await check_has_country(ctx.author.id):
             await ctx.send("Сначала выберите страну командой `/select_country`", ephemeral=True)
             return
         
-        country = get_player_country(ctx.author.id)
+        country = await get_player_country(ctx.author.id)
         
         # Если регион не указан, показываем список доступных регионов
         if not region_id:
-            regions = get_player_regions(ctx.author.id)
+            regions = await get_player_regions(ctx.author.id)
             if not regions:
                 await ctx.send(f"У вас нет контролируемых регионов в стране {country}.", ephemeral=True)
                 return
@@ -177,7 +181,7 @@ class RegionCog(commands.Cog):
             return
         
         # Проверяем, контролирует ли игрок этот регион
-        region_status = get_region_control_status(ctx.author.id, region_id)
+        region_status = await get_region_control_status(ctx.author.id, region_id)
         if not region_status or not region_status['is_controlled']:
             await ctx.send(f"Вы не контролируете регион {region_info['name']}.", ephemeral=True)
             return
@@ -243,11 +247,11 @@ class RegionCog(commands.Cog):
             return
         
         # Проверяем, выбрана ли страна у целевого игрока
-        if not check_has_country(target.id):
+        if not await check_has_country(target.id):
             await ctx.send(f"У {target.name} не выбрана страна.", ephemeral=True)
             return
         
-        country = get_player_country(target.id)
+        country = await get_player_country(target.id)
         
         # Проверяем, существует ли такой регион для данной страны
         region_info = get_region_info(country, region_id)
@@ -262,7 +266,7 @@ class RegionCog(commands.Cog):
             return
         
         # Изменяем контроль над регионом
-        result = change_region_control(target.id, region_id, is_controlled=is_gain)
+        result = await change_region_control(target.id, region_id, is_controlled=is_gain)
         
         if not result:
             await ctx.send(f"Не удалось изменить контроль над регионом {region_info['name']}.", ephemeral=True)
@@ -323,11 +327,11 @@ class RegionCog(commands.Cog):
             return
         
         # Проверяем, выбрана ли страна у целевого игрока
-        if not check_has_country(target.id):
+        if not await check_has_country(target.id):
             await ctx.send(f"У {target.name} не выбрана страна.", ephemeral=True)
             return
         
-        country = get_player_country(target.id)
+        country = await get_player_country(target.id)
         
         # Проверяем, существует ли такой регион для данной страны
         region_info = get_region_info(country, region_id)
@@ -336,7 +340,7 @@ class RegionCog(commands.Cog):
             return
         
         # Проверяем, контролирует ли игрок этот регион
-        region_status = get_region_control_status(target.id, region_id)
+        region_status = await get_region_control_status(target.id, region_id)
         if not region_status or not region_status['is_controlled']:
             await ctx.send(f"Игрок {target.name} не контролирует регион {region_info['name']}.", ephemeral=True)
             return
@@ -348,7 +352,7 @@ class RegionCog(commands.Cog):
         
         # Устанавливаем уровень повреждения
         is_damaged = damage_level > 0
-        result = set_region_damage(target.id, region_id, is_damaged, damage_level)
+        result = await set_region_damage(target.id, region_id, is_damaged, damage_level)
         
         if not result:
             await ctx.send(f"Не удалось изменить статус повреждения региона {region_info['name']}.", ephemeral=True)
@@ -412,10 +416,10 @@ class RegionCog(commands.Cog):
         """Показать список всех регионов для указанной страны"""
         # Если страна не указана, используем страну игрока
         if not country_name:
-            if not check_has_country(ctx.author.id):
+            if not await check_has_country(ctx.author.id):
                 await ctx.send("Укажите название страны или выберите свою страну командой `/select_country`", ephemeral=True)
                 return
-            country_name = get_player_country(ctx.author.id)
+            country_name = await get_player_country(ctx.author.id)
         
         # Проверяем, есть ли регионы для указанной страны
         if country_name not in COUNTRY_REGIONS:
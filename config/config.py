@@ -78,4 +78,72 @@ UNITS_INFO = {
         'ammo': AMMO_PER_SHIP,
         'power': SHIP_POWER
     }
-} 
\ No newline at end of file
+}
+
+# Настройки базы данных
+DB_PATH = 'vpi.db'  # Путь к файлу базы данных SQLite
+DB_POOL_SIZE = 5  # Максимальное количество одновременно открытых соединений
+DB_POOL_TIMEOUT = 10  # Время ожидания свободного соединения (в секундах)
+DB_BUSY_TIMEOUT = 5000  # Время ожидания снятия блокировки базы (в миллисекундах)
+DB_WORKERS = 4  # Количество рабочих потоков для запросов к базе (не больше DB_POOL_SIZE)
+DB_QUEUE_SIZE = 100  # Максимальное количество запросов к базе в очереди
+
+# Настройки хранилища SQLite
+DB_JOURNAL_MODE = 'WAL'  # Режим журнала: WAL позволяет читать во время записи
+DB_SYNCHRONOUS = 'NORMAL'  # В режиме WAL fsync выполняется только при чекпоинте
+DB_CACHE_SIZE = -16000  # Размер кэша страниц (отрицательное значение - в КиБ)
+DB_MMAP_SIZE = 64 * 1024 * 1024  # Размер отображаемой в память части файла базы (в байтах)
+DB_TEMP_STORE = 'MEMORY'  # Временные таблицы и индексы хранятся в памяти
+DB_WAL_AUTOCHECKPOINT = 1000  # Автоматический чекпоинт после указанного количества страниц в WAL
+DB_CHECKPOINT_INTERVAL = 300  # Интервал фоновых пассивных чекпоинтов (в секундах)
+
+# Фоновое начисление продукции заводов
+PRODUCTION_TICK_ENABLED = False  # Периодически зачислять продукцию всем игрокам
+PRODUCTION_TICK_INTERVAL = 600  # Интервал начисления (в секундах)
+PRODUCTION_TICK_DRY_RUN = False  # Только считать продукцию, не изменяя базу
+
+# Подробный вывод серверов и разрешений бота при подключении к шлюзу
+STARTUP_DIAGNOSTICS = False
+
+# Подключение к шлюзу Discord
+# 'lean' - только нужные интенты, участники серверов не кэшируются
+# 'full' - все интенты и полный кэш участников
+GATEWAY_PROFILE = 'lean'
+
+# Шардирование
+# 'none' - одно подключение к шлюзу,
+# 'auto' - AutoShardedBot, количество шардов определяет Discord,
+# 'range' - процесс запускает только шарды SHARD_IDS из SHARD_COUNT; несколько
+# таких процессов работают с общей базой. Переменные окружения SHARD_COUNT и
+# SHARD_IDS (например, 0-3 или 0,2) переопределяют настройки ниже
+SHARDING_MODE = 'none'
+SHARD_COUNT = None
+SHARD_IDS = None
+SHARD_METRICS_INTERVAL = 60  # Интервал замера задержки и частоты событий шардов (в секундах)
+
+# Создание игроков
+# 'bulk' - при добавлении бота на сервер создаются все участники сервера,
+# 'lazy' - игрок создается при первой команде
+PLAYER_PROVISIONING = 'bulk'
+PLAYER_PROVISIONING_CHUNK = 1000  # Количество игроков, создаваемых одной транзакцией
+
+# Кэш состояний игроков
+PLAYER_CACHE_SIZE = 1000  # Максимальное количество игроков в кэше
+
+# История боев
+BATTLE_HISTORY_PAGE_SIZE = 5  # Количество боев на одной странице /history
+BATTLE_ARCHIVE_ENABLED = False  # Периодически переносить старые бои в архив
+BATTLE_ARCHIVE_PATH = 'vpi_archive.db'  # Файл архива боев
+BATTLE_ARCHIVE_AGE_DAYS = 30  # Бои старше указанного количества дней переносятся в архив
+BATTLE_ARCHIVE_BATCH = 1000  # Количество боев, переносимых одной транзакцией
+BATTLE_ARCHIVE_INTERVAL = 3600  # Интервал запуска архивации (в секундах)
+
+# Рейтинг боевой мощи (/leaderboard)
+LEADERBOARD_PAGE_SIZE = 10  # Количество игроков на одной странице рейтинга
+
+# Прогноз исхода боя (/predict)
+BATTLE_PREDICT_TRIALS = 10000  # Количество случайных боев в одном прогнозе
+BATTLE_PREDICT_CACHE_SIZE = 1024  # Количество пар армий, для которых хранятся прогнозы
+
+# Бюджет времени холодного запуска для benchmarks/bench_startup.py (в миллисекундах)
+STARTUP_BUDGET_MS = 2000
@@ -80,6 +80,33 @@ def get_political_system_effects(system_id):
     system = POLITICAL_SYSTEMS.get(system_id)
     return system['effects'] if system else {}
 
+# Индексы в таблице модификаторов
+PRODUCTION = 0
+ECONOMY = 1
+MILITARY = 2
+
+NO_MODIFIERS = (0.0, 0.0, 0.0)
+
+def _compile_modifiers(effects):
+    """Сводит эффекты системы в (производство, экономика, военная мощь)"""
+    modifiers = [0.0, 0.0, 0.0]
+    for effect_key, effect_value in effects.items():
+        if 'production' in effect_key:
+            modifiers[PRODUCTION] += effect_value
+        elif 'economy' in effect_key:
+            modifiers[ECONOMY] += effect_value
+        elif 'military' in effect_key:
+            modifiers[MILITARY] += effect_value
+    return tuple(modifiers)
+
+# Таблица модификаторов, собранная один раз при импорте: id системы -> (производство, экономика, военная мощь)
+POLITICAL_MODIFIERS = {system_id: _compile_modifiers(system['effects']) for system_id, system in POLITICAL_SYSTEMS.items()}
+
+# Получить модификаторы политической системы
+def get_political_modifiers(system_id):
+    """Возвращает (производство, экономика, военная мощь); без системы - нулевые модификаторы"""
+    return POLITICAL_MODIFIERS.get(system_id, NO_MODIFIERS)
+
 # Форматировать бонус/штраф в процентах для отображения
 def format_effect(effect_value):
     if effect_value > 0:
@@ -332,4 +332,119 @@ def get_region_emoji_and_name(country, region_id):
 def is_capital_region(country, region_id):
     """Проверяет, является ли регион столицей"""
     region = get_region_info(country, region_id)
-    return region.get('is_capital', False) if region else False 
\ No newline at end of file
+    return region.get('is_capital', False) if region else False 
+
+# Компактное представление регионов игрока.
+# Каждому региону страны присваивается порядковый номер (по порядку объявления
+# в конфигурации), и состояние всех регионов игрока кодируется целыми числами:
+# маска контролируемых регионов, маска поврежденных и уровень повреждения
+# (0-4, 3 бита на регион), разложенный на три битовые плоскости. Суммы
+# эффектов по маске берутся из заранее посчитанных таблиц по 8 бит, поэтому
+# подсчет занимает несколько целочисленных операций вместо обхода регионов.
+DAMAGE_BITS = 3
+MAX_DAMAGE_LEVEL = 4
+_CHUNK_BITS = 8
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+
+# Порядковые номера регионов: страна -> {region_id: номер}
+REGION_ORDINALS = {
+    country: {region_id: ordinal for ordinal, region_id in enumerate(regions)}
+    for country, regions in COUNTRY_REGIONS.items()
+}
+
+def _region_effect_vector(region_info):
+    """Эффекты региона в виде (экономика, производство, военная мощь)"""
+    economy = production = military = 0.0
+    for effect_key, effect_value in region_info['effects'].items():
+        if 'production' in effect_key:
+            production += effect_value
+        elif 'economy' in effect_key:
+            economy += effect_value
+        elif 'military' in effect_key:
+            military += effect_value
+    return economy, production, military
+
+def _build_effect_tables(regions):
+    """Таблицы сумм эффектов для каждого 8-битного фрагмента маски регионов"""
+    vectors = [_region_effect_vector(region_info) for region_info in regions.values()]
+    tables = []
+    for start in range(0, len(vectors), _CHUNK_BITS):
+        chunk = vectors[start:start + _CHUNK_BITS]
+        table = [(0.0, 0.0, 0.0)] * (1 << len(chunk))
+        for mask in range(1, len(table)):
+            # Сумма для маски = сумма для маски без младшего бита + вектор этого бита
+            low_bit = (mask & -mask).bit_length() - 1
+            rest = table[mask & (mask - 1)]
+            vector = chunk[low_bit]
+            table[mask] = (rest[0] + vector[0], rest[1] + vector[1], rest[2] + vector[2])
+        tables.append(table)
+    return tables
+
+REGION_EFFECT_TABLES = {country: _build_effect_tables(regions) for country, regions in COUNTRY_REGIONS.items()}
+
+def count_regions(mask):
+    """Количество регионов в маске"""
+    return bin(mask).count('1')
+
+def encode_region_states(country, region_states):
+    """Кодирует состояние регионов игрока в (контроль, повреждения, плоскости уровня повреждения).
+
+    region_states - словарь region_id -> {'is_controlled', 'is_damaged', 'damage_level'}.
+    Регионы, которых нет в конфигурации страны, пропускаются.
+    """
+    ordinals = REGION_ORDINALS.get(country, {})
+    controlled = damaged = 0
+    planes = [0] * DAMAGE_BITS
+    for region_id, status in region_states.items():
+        ordinal = ordinals.get(region_id)
+        if ordinal is None:
+            continue
+        bit = 1 << ordinal
+        if status['is_controlled']:
+            controlled |= bit
+        if status['is_damaged']:
+            damaged |= bit
+            level = min(max(status['damage_level'] or 0, 0), MAX_DAMAGE_LEVEL)
+            for plane in range(DAMAGE_BITS):
+                if level >> plane & 1:
+                    planes[plane] |= bit
+    return controlled, damaged, tuple(planes)
+
+def sum_region_effects(country, mask):
+    """Суммарные эффекты (экономика, производство, военная мощь) регионов из маски"""
+    economy = production = military = 0.0
+    for table in REGION_EFFECT_TABLES.get(country, []):
+        vector = table[mask & _CHUNK_MASK]
+        economy += vector[0]
+        production += vector[1]
+        military += vector[2]
+        mask >>= _CHUNK_BITS
+    return economy, production, military
+
+# Суммировать эффекты регионов по битовым маскам
+def summarize_region_bits(country, controlled, damaged, planes):
+    """Возвращает суммарные эффекты и количество контролируемых и поврежденных регионов по маскам"""
+    # Каждый уровень повреждения снижает эффекты региона на 25%:
+    # эффект = сумма по контролируемым - 0.25 * сумма по битам уровня с весами 1, 2, 4
+    effects = list(sum_region_effects(country, controlled))
+    for index, plane in enumerate(planes):
+        penalty = sum_region_effects(country, plane & controlled)
+        weight = 0.25 * (1 << index)
+        for effect in range(3):
+            effects[effect] -= weight * penalty[effect]
+    
+    return {
+        'economy': effects[0],
+        'production': effects[1],
+        'military': effects[2],
+        'controlled': count_regions(controlled),
+        'damaged': count_regions(damaged & controlled)
+    }
+
+# Суммировать эффекты контролируемых регионов с учетом повреждений
+def summarize_region_effects(country, region_states):
+    """Возвращает суммарные эффекты регионов и количество контролируемых и поврежденных регионов.
+
+    region_states - словарь region_id -> {'is_controlled', 'is_damaged', 'damage_level'}
+    """
+    return summarize_region_bits(country, *encode_region_states(country, region_states))
@@ -1,7 +1,9 @@
+import os
 import sqlite3
 import logging
 import sys
-from utils.db import initialize_player_regions
+from utils.db import init_db, initialize_player_regions, check_regions_consistency
+from config.config import BATTLE_ARCHIVE_PATH
 
 # Настройка логирования
 logging.basicConfig(
@@ -39,9 +41,21 @@ def reset_all_player_data():
         
         # Очищаем заводы
         c.execute('DELETE FROM factories')
+        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='production_ledger'")
+        if c.fetchone():
+            c.execute('DELETE FROM production_ledger')
+        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='player_power'")
+        if c.fetchone():
+            c.execute('DELETE FROM player_power')
         
         # Очищаем историю боев
         c.execute('DELETE FROM battle_history')
+        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='battle_daily_stats'")
+        if c.fetchone():
+            c.execute('DELETE FROM battle_daily_stats')
+        if os.path.exists(BATTLE_ARCHIVE_PATH):
+            c.execute('ATTACH DATABASE ? AS archive', (BATTLE_ARCHIVE_PATH,))
+            c.execute('DELETE FROM archive.battle_history')
         
         # Очищаем информацию о регионах
         c.execute('DELETE FROM country_regions')
@@ -60,32 +74,31 @@ def reset_all_player_data():
             conn.close()
 
 def reinitialize_missing_regions():
-    """Переинициализирует регионы для игроков, которые имеют страну, но не имеют регионов"""
+    """Проверяет регионы игроков и восстанавливает недостающие"""
     try:
-        conn = sqlite3.connect('vpi.db')
-        c = conn.cursor()
+        # Применяем миграции: регионы игроков хранятся только в country_regions
+        init_db()
+        problems = check_regions_consistency()
         
-        # Ищем игроков у которых есть страна, но нет регионов
-        c.execute('SELECT user_id, country FROM players WHERE country IS NOT NULL AND (regions IS NULL OR regions = "")')
-        players = c.fetchall()
+        for user_id, country, region_id in problems['unknown']:
+            logger.warning(f"Игрок {user_id}: регион {region_id} отсутствует в конфигурации страны {country}")
+        for user_id, country in problems['orphaned']:
+            logger.warning(f"Игрок {user_id}: есть регионы страны {country}, которую он не выбирал")
         
+        # Ищем игроков, у которых есть страна, но не хватает регионов
+        players = sorted({(user_id, country) for user_id, country, _ in problems['missing']})
         if not players:
             logger.info("Нет игроков с отсутствующими регионами.")
             return
         
         # Инициализируем регионы для каждого найденного игрока
-        fixed_count = 0
         for user_id, country in players:
             initialize_player_regions(user_id, country)
-            fixed_count += 1
         
-        logger.info(f"✅ Регионы восстановлены для {fixed_count} игроков.")
+        logger.info(f"✅ Регионы восстановлены для {len(players)} игроков.")
         
     except sqlite3.Error as e:
         logger.error(f"Ошибка при восстановлении регионов: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 if __name__ == "__main__":
     # При запуске с аргументом --check-regions только проверяем и восстанавливаем регионы
@@ -0,0 +1,94 @@
+"""Архивация старой истории боев.
+
+Бои старше заданного возраста переносятся из battle_history в отдельный
+файл архива (подключается через ATTACH), а в основной базе остается только
+компактная сводка по дням для каждого игрока: количество боев, победы,
+поражения, выставленная боевая сила и потери. Так рабочая таблица и файл
+основной базы не растут вместе со всей историей сервера.
+"""
+import logging
+from config.config import BATTLE_ARCHIVE_PATH, BATTLE_ARCHIVE_BATCH
+from utils.db_pool import get_connection, transaction
+
+logger = logging.getLogger('vpi')
+
+def attach_archive(conn, path=BATTLE_ARCHIVE_PATH):
+    """Подключает файл архива к соединению и создает в нем таблицу боев"""
+    attached = [row[1] for row in conn.execute('PRAGMA database_list')]
+    if 'archive' not in attached:
+        conn.execute('ATTACH DATABASE ? AS archive', (path,))
+    conn.execute('''CREATE TABLE IF NOT EXISTS archive.battle_history
+                    (id INTEGER PRIMARY KEY,
+                     attacker_id INTEGER,
+                     defender_id INTEGER,
+                     attacker_troops INTEGER,
+                     defender_troops INTEGER,
+                     attacker_losses INTEGER,
+                     defender_losses INTEGER,
+                     winner_id INTEGER,
+                     battle_date TIMESTAMP)''')
+
+def _archive_batch(cutoff, batch_size):
+    """Переносит в архив одну порцию боев старше cutoff, возвращает их количество"""
+    with transaction() as conn:
+        c = conn.cursor()
+        # Старые бои находятся в начале таблицы, поэтому обход по id быстро
+        # находит границу порции
+        c.execute('''SELECT MAX(id), COUNT(*) FROM (SELECT id FROM battle_history
+                                                    WHERE battle_date < ?
+                                                    ORDER BY id LIMIT ?)''', (cutoff, batch_size))
+        last_id, count = c.fetchone()
+        if not count:
+            return 0
+
+        # Сводка по дням: каждый бой учитывается у атакующего и у защищающегося
+        c.execute('''INSERT INTO battle_daily_stats
+                         (user_id, day, battles, wins, defeats, troops, losses)
+                     SELECT user_id, day, COUNT(*), SUM(won), SUM(1 - won), SUM(troops), SUM(losses)
+                     FROM (SELECT attacker_id AS user_id, date(battle_date) AS day,
+                                  winner_id = attacker_id AS won,
+                                  attacker_troops AS troops, attacker_losses AS losses
+                           FROM battle_history WHERE id <= ? AND battle_date < ?
+                           UNION ALL
+                           SELECT defender_id, date(battle_date), winner_id = defender_id,
+                                  defender_troops, defender_losses
+                           FROM battle_history
+                           WHERE id <= ? AND battle_date < ? AND defender_id != attacker_id)
+                     GROUP BY user_id, day
+                     ON CONFLICT(user_id, day) DO UPDATE SET
+                         battles = battles + excluded.battles,
+                         wins = wins + excluded.wins,
+                         defeats = defeats + excluded.defeats,
+                         troops = troops + excluded.troops,
+                         losses = losses + excluded.losses''',
+                  (last_id, cutoff, last_id, cutoff))
+
+        # Архив находится в другом файле: при повторном переносе после сбоя
+        # уже скопированные бои просто пропускаются
+        c.execute('''INSERT OR IGNORE INTO archive.battle_history
+                     SELECT id, attacker_id, defender_id, attacker_troops, defender_troops,
+                            attacker_losses, defender_losses, winner_id, battle_date
+                     FROM battle_history WHERE id <= ? AND battle_date < ?''', (last_id, cutoff))
+        c.execute('DELETE FROM battle_history WHERE id <= ? AND battle_date < ?', (last_id, cutoff))
+        return c.rowcount
+
+def archive_battles(max_age_days, batch_size=BATTLE_ARCHIVE_BATCH, path=BATTLE_ARCHIVE_PATH):
+    """Переносит в архив бои старше max_age_days дней и возвращает их количество.
+
+    Каждая порция переносится отдельной транзакцией, чтобы не задерживать
+    другие записи в базу надолго.
+    """
+    with get_connection() as conn:
+        attach_archive(conn, path)
+        cutoff = conn.execute("SELECT datetime('now', ?)", (f'-{max_age_days} days',)).fetchone()[0]
+
+        archived = 0
+        while True:
+            count = _archive_batch(cutoff, batch_size)
+            archived += count
+            if count < batch_size:
+                break
+
+    if archived:
+        logger.info(f"Перенесено в архив боев: {archived}")
+    return archived
@@ -0,0 +1,104 @@
+"""Асинхронные обертки над функциями utils/db.py.
+
+Все запросы к SQLite выполняются в отдельных рабочих потоках, поэтому
+ожидание диска (fsync, блокировки базы) не останавливает цикл событий
+бота. Очередь запросов ограничена: при переполнении новые запросы ждут
+освобождения места, а не накапливаются без предела.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config.config import DB_WORKERS, DB_QUEUE_SIZE
+from utils import db, storage, archive
+from utils.metrics import metrics
+
+logger = logging.getLogger('vpi')
+
+_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='vpi-db')
+_queue_slots = None
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет синхронную функцию работы с базой в рабочем потоке"""
+    global _queue_slots
+    if _queue_slots is None:
+        _queue_slots = asyncio.Semaphore(DB_QUEUE_SIZE)
+
+    loop = asyncio.get_running_loop()
+    queued_at = loop.time()
+    async with _queue_slots:
+        metrics.observe('db.queue_wait_ms', (loop.time() - queued_at) * 1000)
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def _make_async(func):
+    """Создает асинхронную версию функции из utils/db.py"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+def shutdown():
+    """Дожидается завершения запросов и останавливает рабочие потоки"""
+    _executor.shutdown(wait=True)
+
+init_db = _make_async(db.init_db)
+
+# Игроки
+get_player_state = _make_async(db.get_player_state)
+get_player_data = _make_async(db.get_player_data)
+create_player = _make_async(db.create_player)
+create_players = _make_async(db.create_players)
+ensure_player = _make_async(db.ensure_player)
+get_player_country = _make_async(db.get_player_country)
+set_player_country = _make_async(db.set_player_country)
+initialize_player_regions = _make_async(db.initialize_player_regions)
+check_has_country = _make_async(db.check_has_country)
+
+# Политические системы
+get_player_political_system = _make_async(db.get_player_political_system)
+set_player_political_system = _make_async(db.set_player_political_system)
+get_adjusted_production_rate = _make_async(db.get_adjusted_production_rate)
+get_adjusted_military_power = _make_async(db.get_adjusted_military_power)
+
+# Экономика и инвентарь
+update_budget = _make_async(db.update_budget)
+add_budget = _make_async(db.add_budget)
+get_budget = _make_async(db.get_budget)
+update_inventory = _make_async(db.update_inventory)
+add_inventory = _make_async(db.add_inventory)
+get_inventory = _make_async(db.get_inventory)
+purchase_units = _make_async(db.purchase_units)
+
+# Военные заводы
+get_factories_count = _make_async(db.get_factories_count)
+build_factory = _make_async(db.build_factory)
+purchase_factory = _make_async(db.purchase_factory)
+calculate_production = _make_async(db.calculate_production)
+settle_production = _make_async(db.settle_production)
+settle_all_production = _make_async(db.settle_all_production)
+
+# Боевая система
+log_battle = _make_async(db.log_battle)
+resolve_battle = _make_async(db.resolve_battle)
+get_battle_history = _make_async(db.get_battle_history)
+get_battle_history_page = _make_async(db.get_battle_history_page)
+get_leaderboard_page = _make_async(db.get_leaderboard_page)
+
+# Регионы
+get_player_regions = _make_async(db.get_player_regions)
+set_player_regions = _make_async(db.set_player_regions)
+get_player_controlled_regions = _make_async(db.get_player_controlled_regions)
+get_region_states = _make_async(db.get_region_states)
+check_regions_consistency = _make_async(db.check_regions_consistency)
+get_region_control_status = _make_async(db.get_region_control_status)
+change_region_control = _make_async(db.change_region_control)
+set_region_damage = _make_async(db.set_region_damage)
+repair_region = _make_async(db.repair_region)
+get_adjusted_economic_bonus = _make_async(db.get_adjusted_economic_bonus)
+get_adjusted_production_with_regions = _make_async(db.get_adjusted_production_with_regions)
+get_adjusted_military_power_with_regions = _make_async(db.get_adjusted_military_power_with_regions)
+
+# Хранилище
+checkpoint = _make_async(storage.checkpoint)
+get_storage_stats = _make_async(storage.get_storage_stats)
+archive_battles = _make_async(archive.archive_battles)
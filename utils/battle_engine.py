@@ -0,0 +1,103 @@
+"""Расчет боевой мощи и исхода боев.
+
+Боевая мощь юнитов из UNITS_INFO один раз раскладывается в массив, а армия
+игрока представляется вектором количеств юнитов фиксированной длины в
+порядке UNIT_TYPES. Мощь и потери считаются над этими векторами: если
+установлен NumPy, пачки армий и серии случайных боев обрабатываются
+векторно, иначе используется эквивалентный код на чистом Python.
+
+Сами изменения инвентаря выполняет utils/db.py относительными запросами к
+базе, поэтому остатки войск здесь не вычисляются.
+"""
+import random
+from functools import lru_cache
+from operator import mul
+from config.config import UNITS_INFO, BATTLE_PREDICT_TRIALS, BATTLE_PREDICT_CACHE_SIZE
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Порядок юнитов в векторах армий
+UNIT_TYPES = tuple(UNITS_INFO)
+UNIT_POWER = tuple(UNITS_INFO[unit_type]['power'] for unit_type in UNIT_TYPES)
+
+# Доля войск, которую теряет победитель (проигравший теряет все войска)
+WINNER_LOSS_RATE = 0.3
+# Случайный фактор боя: мощь каждой стороны умножается на 1 ± RANDOM_SPREAD
+RANDOM_SPREAD = 0.2
+
+if numpy is not None:
+    _POWER_VECTOR = numpy.array(UNIT_POWER, dtype=numpy.int64)
+
+def army_from_inventory(inventory):
+    """Вектор количеств юнитов из инвентаря игрока"""
+    return tuple(inventory.get(unit_type, 0) for unit_type in UNIT_TYPES)
+
+def army_to_dict(army):
+    """Словарь {тип юнита: количество} из вектора, без нулевых позиций"""
+    return {unit_type: count for unit_type, count in zip(UNIT_TYPES, army) if count}
+
+def army_power(army):
+    """Боевая мощь армии"""
+    return sum(map(mul, army, UNIT_POWER))
+
+def armies_power(armies):
+    """Боевая мощь для пачки армий"""
+    if numpy is not None and armies:
+        return (numpy.asarray(armies, dtype=numpy.int64) @ _POWER_VECTOR).tolist()
+    return [sum(map(mul, army, UNIT_POWER)) for army in armies]
+
+def battle_losses(army, won):
+    """Потери армии: доля WINNER_LOSS_RATE при победе, все войска при поражении"""
+    if not won:
+        return tuple(army)
+    return tuple(int(count * WINNER_LOSS_RATE) for count in army)
+
+def roll_battle(attacker_power, defender_power, rng=random):
+    """Один бой со случайным фактором; True, если победил атакующий"""
+    attacker_final = attacker_power * rng.uniform(1 - RANDOM_SPREAD, 1 + RANDOM_SPREAD)
+    defender_final = defender_power * rng.uniform(1 - RANDOM_SPREAD, 1 + RANDOM_SPREAD)
+    return attacker_final > defender_final
+
+def count_attacker_wins(attacker_power, defender_power, trials, seed=None):
+    """Количество побед атакующего в серии из trials случайных боев"""
+    if numpy is not None:
+        rng = numpy.random.default_rng(seed)
+        attacker_final = attacker_power * rng.uniform(1 - RANDOM_SPREAD, 1 + RANDOM_SPREAD, trials)
+        defender_final = defender_power * rng.uniform(1 - RANDOM_SPREAD, 1 + RANDOM_SPREAD, trials)
+        return int(numpy.count_nonzero(attacker_final > defender_final))
+    rng = random.Random(seed)
+    return sum(roll_battle(attacker_power, defender_power, rng) for _ in range(trials))
+
+def simulate_battle(attacker, defender, rng=random):
+    """Проводит бой между двумя армиями.
+
+    Возвращает (победил_атакующий, потери атакующего, потери защищающегося,
+    мощь атакующего, мощь защищающегося); потери - векторы в порядке UNIT_TYPES.
+    """
+    attacker_power = army_power(attacker)
+    defender_power = army_power(defender)
+    attacker_won = roll_battle(attacker_power, defender_power, rng)
+    return (attacker_won,
+            battle_losses(attacker, attacker_won),
+            battle_losses(defender, not attacker_won),
+            attacker_power,
+            defender_power)
+
+@lru_cache(maxsize=BATTLE_PREDICT_CACHE_SIZE)
+def predict_battle(attacker, defender, trials=BATTLE_PREDICT_TRIALS):
+    """Прогноз боя методом Монте-Карло по тем же правилам, что и simulate_battle.
+
+    Армии передаются векторами (кортежами), поэтому прогноз кэшируется для
+    каждой пары состояний армий и пересчитывается только после их изменения.
+    Возвращает (вероятность победы атакующего, ожидаемые потери атакующего,
+    ожидаемые потери защищающегося); потери - векторы в порядке UNIT_TYPES.
+    """
+    win_rate = count_attacker_wins(army_power(attacker), army_power(defender), trials) / trials
+    attacker_losses = tuple(win_rate * won + (1 - win_rate) * lost
+                            for won, lost in zip(battle_losses(attacker, True), attacker))
+    defender_losses = tuple(win_rate * lost + (1 - win_rate) * won
+                            for won, lost in zip(battle_losses(defender, True), defender))
+    return win_rate, attacker_losses, defender_losses
@@ -1,134 +1,121 @@
-import sqlite3
+import json
+import time
 from datetime import datetime
 import logging
-from config.config import FACTORY_PRODUCTION_RATE
+from config.config import FACTORY_COST, FACTORY_PRODUCTION_RATE, UNITS_INFO
+from utils.db_pool import get_connection, transaction
+from utils.storage import configure_storage
+from utils.migrations import migrate
+from utils.player_cache import PlayerState, player_cache
+from config.regions import encode_region_states, summarize_region_bits
+from config.political_systems import get_political_modifiers, PRODUCTION, ECONOMY, MILITARY
+from utils.battle_engine import army_from_inventory, army_power
 
 logger = logging.getLogger('vpi')
 
 def init_db():
-    """Инициализирует базу данных и создает таблицы"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    
-    # Создаем таблицу для хранения данных игроков
-    c.execute('''CREATE TABLE IF NOT EXISTS players
-                 (user_id INTEGER PRIMARY KEY,
-                  username TEXT,
-                  budget INTEGER DEFAULT 1000000,
-                  country TEXT,
-                  political_system TEXT,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    # Проверяем, нужно ли добавить колонку political_system
-    try:
-        c.execute('SELECT political_system FROM players LIMIT 1')
-    except sqlite3.OperationalError:
-        # Колонка не существует, добавляем ее
-        c.execute('ALTER TABLE players ADD COLUMN political_system TEXT')
-        logger.info("Добавлена колонка political_system в таблицу players")
-    
-    # Проверяем, нужно ли добавить колонку regions
-    try:
-        c.execute('SELECT regions FROM players LIMIT 1')
-    except sqlite3.OperationalError:
-        # Колонка не существует, добавляем ее
-        c.execute('ALTER TABLE players ADD COLUMN regions TEXT')
-        logger.info("Добавлена колонка regions в таблицу players")
-    
-    # Создаем таблицу для хранения инвентаря
-    c.execute('''CREATE TABLE IF NOT EXISTS inventory
-                 (user_id INTEGER,
-                  item_type TEXT,
-                  quantity INTEGER,
-                  FOREIGN KEY (user_id) REFERENCES players(user_id),
-                  PRIMARY KEY (user_id, item_type))''')
-    
-    # Создаем таблицу для хранения истории боев
-    c.execute('''CREATE TABLE IF NOT EXISTS battle_history
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  attacker_id INTEGER,
-                  defender_id INTEGER,
-                  attacker_troops INTEGER,
-                  defender_troops INTEGER,
-                  attacker_losses INTEGER,
-                  defender_losses INTEGER,
-                  winner_id INTEGER,
-                  battle_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (attacker_id) REFERENCES players(user_id),
-                  FOREIGN KEY (defender_id) REFERENCES players(user_id))''')
-    
-    # Создаем таблицу для хранения военных заводов пехотного вооружения
-    c.execute('''CREATE TABLE IF NOT EXISTS factories
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  production_rate INTEGER NOT NULL DEFAULT 1000,
-                  last_production TEXT,
-                  FOREIGN KEY (user_id) REFERENCES players(user_id))''')
-    
-    # Создаем таблицу для хранения информации о регионах стран
-    c.execute('''CREATE TABLE IF NOT EXISTS country_regions
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  country TEXT,
-                  region_id TEXT,
-                  is_controlled BOOLEAN DEFAULT 1,
-                  is_damaged BOOLEAN DEFAULT 0,
-                  damage_level INTEGER DEFAULT 0,
-                  FOREIGN KEY (user_id) REFERENCES players(user_id))''')
-    
-    # Проверяем, есть ли в таблице factories записи с NULL значениями
-    c.execute('''SELECT id FROM factories 
-                 WHERE production_rate IS NULL OR last_production IS NULL''')
-    null_factories = c.fetchall()
-    
-    # Если есть записи с NULL значениями, обновляем их
-    if null_factories:
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        c.execute('''UPDATE factories 
-                     SET production_rate = ?, last_production = ? 
-                     WHERE production_rate IS NULL OR last_production IS NULL''', 
-                  (FACTORY_PRODUCTION_RATE, current_time))
-    
-    conn.commit()
-    conn.close()
+    """Инициализирует базу данных и применяет недостающие миграции схемы"""
+    with get_connection() as conn:
+        # Включаем WAL до начала любых транзакций
+        configure_storage(conn)
+    migrate()
+
+def get_player_state(user_id):
+    """Возвращает состояние игрока из кэша или загружает его одним запросом"""
+    if player_cache.shared:
+        with get_connection() as conn:
+            player_cache.sync(conn)
+    state = player_cache.get(user_id)
+    if state is not None:
+        return state
+    
+    generation = player_cache.generation
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('''SELECT p.country, p.political_system, p.budget,
+                            (SELECT COUNT(*) FROM factories f WHERE f.user_id = p.user_id),
+                            (SELECT json_group_object(i.item_type, i.quantity)
+                             FROM inventory i WHERE i.user_id = p.user_id),
+                            (SELECT json_group_object(cr.region_id,
+                                        json_array(cr.is_controlled, cr.is_damaged, cr.damage_level))
+                             FROM country_regions cr
+                             WHERE cr.user_id = p.user_id AND cr.country = p.country)
+                     FROM players p WHERE p.user_id = ?''', (user_id,))
+        row = c.fetchone()
+        if row:
+            region_states = {
+                region_id: {
+                    'is_controlled': bool(is_controlled),
+                    'is_damaged': bool(is_damaged),
+                    'damage_level': damage_level
+                }
+                for region_id, (is_controlled, is_damaged, damage_level) in json.loads(row[5]).items()
+            }
+            region_bits = encode_region_states(row[0], region_states)
+            state = PlayerState(True, country=row[0] or None, political_system=row[1] or None,
+                                budget=row[2], inventory=json.loads(row[4]), factories_count=row[3],
+                                regions=[region_id for region_id, status in region_states.items()
+                                         if status['is_controlled']],
+                                region_states=region_states, region_bits=region_bits,
+                                region_effects=summarize_region_bits(row[0], *region_bits))
+        else:
+            state = PlayerState(False)
+        # Незафиксированные изменения текущей транзакции в кэш не попадают
+        if not conn.in_transaction:
+            player_cache.put(user_id, state, generation)
+    return state
 
-# Функции для работы с игроками
 def get_player_data(user_id):
     """Получает данные игрока из базы данных"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('SELECT * FROM players WHERE user_id = ?', (user_id,))
-    player = c.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT * FROM players WHERE user_id = ?', (user_id,))
+        player = c.fetchone()
     return player
 
 def create_player(user_id, username):
     """Создает нового игрока в базе данных"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('INSERT OR IGNORE INTO players (user_id, username) VALUES (?, ?)',
-              (user_id, username))
-    c.execute('INSERT OR IGNORE INTO inventory (user_id, item_type, quantity) VALUES (?, ?, ?)',
-              (user_id, 'infantry', 0))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('INSERT OR IGNORE INTO players (user_id, username) VALUES (?, ?)',
+                  (user_id, username))
+        c.execute('INSERT OR IGNORE INTO inventory (user_id, item_type, quantity) VALUES (?, ?, ?)',
+                  (user_id, 'infantry', 0))
+        conn.commit()
+    player_cache.invalidate(user_id)
+
+def create_players(players):
+    """Создает игроков пачкой в одной транзакции.
+
+    players - список пар (user_id, username). Уже существующие игроки
+    пропускаются. Возвращает количество созданных игроков.
+    """
+    with transaction() as conn:
+        c = conn.cursor()
+        before = conn.total_changes
+        c.executemany('INSERT OR IGNORE INTO players (user_id, username) VALUES (?, ?)', players)
+        created = conn.total_changes - before
+        c.executemany('INSERT OR IGNORE INTO inventory (user_id, item_type, quantity) VALUES (?, ?, 0)',
+                      [(user_id, 'infantry') for user_id, _ in players])
+    player_cache.invalidate(*[user_id for user_id, _ in players])
+    return created
+
+def ensure_player(user_id, username):
+    """Создает игрока при первом обращении; для известных игроков запись в базу не выполняется"""
+    if not get_player_state(user_id).exists:
+        create_player(user_id, username)
 
 def get_player_country(user_id):
     """Получает страну игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('SELECT country FROM players WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result and result[0] else None
+    return get_player_state(user_id).country
 
 def set_player_country(user_id, country):
     """Устанавливает страну игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('UPDATE players SET country = ? WHERE user_id = ?', (country, user_id))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('UPDATE players SET country = ? WHERE user_id = ?', (country, user_id))
+        conn.commit()
+    player_cache.invalidate(user_id)
     
     # Если выбрана страна, инициализируем регионы
     if country:
@@ -145,26 +132,18 @@ def initialize_player_regions(user_id, country):
     regions = list(COUNTRY_REGIONS[country].keys())
     if not regions:
         return
-        
-    # Устанавливаем регионы в таблице players
-    regions_str = ','.join(regions)
     
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
+    with get_connection() as conn:
+        c = conn.cursor()
     
-    # Обновляем список регионов игрока
-    c.execute('UPDATE players SET regions = ? WHERE user_id = ?', 
-              (regions_str, user_id))
+        # Добавляем записи в таблицу country_regions
+        c.executemany('''INSERT OR IGNORE INTO country_regions 
+                         (user_id, country, region_id, is_controlled, is_damaged, damage_level)
+                         VALUES (?, ?, ?, 1, 0, 0)''', 
+                      [(user_id, country, region_id) for region_id in regions])
     
-    # Добавляем записи в таблицу country_regions
-    for region_id in regions:
-        c.execute('''INSERT OR IGNORE INTO country_regions 
-                     (user_id, country, region_id, is_controlled, is_damaged, damage_level)
-                     VALUES (?, ?, ?, 1, 0, 0)''', 
-                  (user_id, country, region_id))
-    
-    conn.commit()
-    conn.close()
+        conn.commit()
+    player_cache.invalidate(user_id)
 
 def check_has_country(user_id):
     """Проверяет, выбрал ли игрок страну"""
@@ -174,198 +153,384 @@ def check_has_country(user_id):
 # Функции для работы с политическими системами
 def get_player_political_system(user_id):
     """Получает политическую систему игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('SELECT political_system FROM players WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result and result[0] else None
+    return get_player_state(user_id).political_system
 
 def set_player_political_system(user_id, political_system):
     """Устанавливает политическую систему игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('UPDATE players SET political_system = ? WHERE user_id = ?', (political_system, user_id))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('UPDATE players SET political_system = ? WHERE user_id = ?', (political_system, user_id))
+        conn.commit()
+    player_cache.invalidate(user_id)
 
 # Получить скорректированное значение производства с учетом политической системы
 def get_adjusted_production_rate(user_id, base_rate):
     """Возвращает скорректированное значение производства с учетом политической системы"""
-    from config.political_systems import get_political_system_effects
-    
     political_system = get_player_political_system(user_id)
     if not political_system:
         return base_rate
     
-    effects = get_political_system_effects(political_system)
-    
     # Применяем бонусы/штрафы к производству
-    modifier = 1.0
-    for key, value in effects.items():
-        if 'production' in key:
-            modifier += value
-    
+    modifier = 1.0 + get_political_modifiers(political_system)[PRODUCTION]
     return int(base_rate * modifier)
 
 # Получить скорректированное значение боевой мощи с учетом политической системы
 def get_adjusted_military_power(user_id, base_power):
     """Возвращает скорректированное значение боевой мощи с учетом политической системы"""
-    from config.political_systems import get_political_system_effects
-    
     political_system = get_player_political_system(user_id)
     if not political_system:
         return base_power
     
-    effects = get_political_system_effects(political_system)
-    
     # Применяем бонусы/штрафы к боевой мощи
-    modifier = 1.0
-    for key, value in effects.items():
-        if 'military' in key:
-            modifier += value
-    
+    modifier = 1.0 + get_political_modifiers(political_system)[MILITARY]
     return int(base_power * modifier)
 
 # Функции для работы с экономикой
 def update_budget(user_id, new_budget):
     """Обновляет бюджет игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('UPDATE players SET budget = ? WHERE user_id = ?', (new_budget, user_id))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('UPDATE players SET budget = ? WHERE user_id = ?', (new_budget, user_id))
+        conn.commit()
+    player_cache.invalidate(user_id)
+
+def add_budget(user_id, amount):
+    """Увеличивает бюджет игрока на amount и возвращает новый бюджет.
+
+    Изменение относительное, поэтому записи, сделанные между чтением бюджета
+    и этим вызовом (в том числе другими процессами бота), не теряются.
+    """
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute('UPDATE players SET budget = budget + ? WHERE user_id = ?', (amount, user_id))
+        c.execute('SELECT budget FROM players WHERE user_id = ?', (user_id,))
+        budget = c.fetchone()
+    player_cache.invalidate(user_id)
+    return budget[0] if budget else 0
 
 def get_budget(user_id):
     """Получает текущий бюджет игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('SELECT budget FROM players WHERE user_id = ?', (user_id,))
-    budget = c.fetchone()
-    conn.close()
-    return budget[0] if budget else 1000000
+    state = get_player_state(user_id)
+    return state.budget if state.exists else 1000000
 
 # Функции для работы с инвентарем
+def _refresh_player_power(c, *user_ids):
+    """Пересчитывает боевую мощь игроков в player_power.
+
+    Вызывается в той же транзакции, что и изменение инвентаря, поэтому
+    рейтинг всегда соответствует инвентарю. Пересчет затрагивает только
+    строки инвентаря самого игрока.
+    """
+    for user_id in user_ids:
+        c.execute('SELECT item_type, quantity FROM inventory WHERE user_id = ?', (user_id,))
+        power = army_power(army_from_inventory(dict(c.fetchall())))
+        c.execute('''INSERT INTO player_power (user_id, power) VALUES (?, ?)
+                     ON CONFLICT(user_id) DO UPDATE SET power = excluded.power''', (user_id, power))
+
 def update_inventory(user_id, item_type, quantity):
     """Обновляет количество предметов в инвентаре игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('''INSERT INTO inventory (user_id, item_type, quantity)
-                 VALUES (?, ?, ?)
-                 ON CONFLICT(user_id, item_type) DO UPDATE SET quantity = ?''',
-              (user_id, item_type, quantity, quantity))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO inventory (user_id, item_type, quantity)
+                     VALUES (?, ?, ?)
+                     ON CONFLICT(user_id, item_type) DO UPDATE SET quantity = ?''',
+                  (user_id, item_type, quantity, quantity))
+        if item_type in UNITS_INFO:
+            _refresh_player_power(c, user_id)
+    player_cache.invalidate(user_id)
+
+def add_inventory(user_id, item_type, amount):
+    """Увеличивает количество предметов в инвентаре игрока и возвращает новое количество.
+
+    Изменение относительное, как при начислении продукции, поэтому
+    продукция, зачисленная фоновым начислением между чтением инвентаря и
+    этим вызовом, не теряется.
+    """
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO inventory (user_id, item_type, quantity)
+                     VALUES (?, ?, ?)
+                     ON CONFLICT(user_id, item_type) DO UPDATE SET quantity = quantity + excluded.quantity''',
+                  (user_id, item_type, amount))
+        c.execute('SELECT quantity FROM inventory WHERE user_id = ? AND item_type = ?', (user_id, item_type))
+        quantity = c.fetchone()[0]
+        if item_type in UNITS_INFO:
+            _refresh_player_power(c, user_id)
+    player_cache.invalidate(user_id)
+    return quantity
 
 def get_inventory(user_id):
     """Получает весь инвентарь игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('SELECT item_type, quantity FROM inventory WHERE user_id = ?', (user_id,))
-    inventory = {row[0]: row[1] for row in c.fetchall()}
-    conn.close()
-    return inventory
+    return dict(get_player_state(user_id).inventory)
+
+def purchase_units(user_id, unit_type, amount):
+    """Покупает юниты в одной транзакции: списывает деньги и пехотное вооружение и добавляет юниты"""
+    unit_info = UNITS_INFO[unit_type]
+    total_cost = amount * unit_info['cost']
+    required_ammo = amount * unit_info['ammo']
+    
+    result = {
+        'success': False,
+        'reason': None,
+        'total_cost': total_cost,
+        'required_ammo': required_ammo
+    }
+    
+    with transaction() as conn:
+        c = conn.cursor()
+        
+        # Списываем деньги, только если их достаточно
+        c.execute('''UPDATE players SET budget = budget - ? 
+                     WHERE user_id = ? AND budget >= ?''', (total_cost, user_id, total_cost))
+        if c.rowcount == 0:
+            c.execute('SELECT budget FROM players WHERE user_id = ?', (user_id,))
+            budget = c.fetchone()
+            result['reason'] = 'budget'
+            result['budget'] = budget[0] if budget else 0
+            return result
+        
+        # Списываем пехотное вооружение, только если его достаточно
+        c.execute('''UPDATE inventory SET quantity = quantity - ? 
+                     WHERE user_id = ? AND item_type = ? AND quantity >= ?''', 
+                  (required_ammo, user_id, 'ammo', required_ammo))
+        if c.rowcount == 0:
+            c.execute('SELECT quantity FROM inventory WHERE user_id = ? AND item_type = ?', 
+                      (user_id, 'ammo'))
+            ammo = c.fetchone()
+            # Отменяем списание денег
+            conn.rollback()
+            result['reason'] = 'ammo'
+            result['ammo'] = ammo[0] if ammo else 0
+            return result
+        
+        # Добавляем купленные юниты
+        c.execute('''INSERT INTO inventory (user_id, item_type, quantity)
+                     VALUES (?, ?, ?)
+                     ON CONFLICT(user_id, item_type) DO UPDATE SET quantity = quantity + excluded.quantity''',
+                  (user_id, unit_type, amount))
+        _refresh_player_power(c, user_id)
+    
+    player_cache.invalidate(user_id)
+    result['success'] = True
+    return result
 
 # Функции для работы с военными заводами
 def get_factories_count(user_id):
     """Получает количество заводов игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('SELECT COUNT(*) FROM factories WHERE user_id = ?', (user_id,))
-    count = c.fetchone()[0]
-    conn.close()
-    return count
+    return get_player_state(user_id).factories_count
 
 def build_factory(user_id):
     """Строит новый завод для игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    c.execute('INSERT INTO factories (user_id, last_production, production_rate) VALUES (?, ?, ?)', 
-             (user_id, current_time, FACTORY_PRODUCTION_RATE))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        c = conn.cursor()
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        c.execute('INSERT INTO factories (user_id, last_production, production_rate) VALUES (?, ?, ?)', 
+                 (user_id, current_time, FACTORY_PRODUCTION_RATE))
+        # Новый завод начинает производить с текущего момента. Время сбора
+        # сдвигается на взвешенное среднее, чтобы накопленное старыми заводами
+        # сохранилось без отдельного начисления
+        c.execute('''INSERT INTO production_ledger (user_id, production_rate, last_settled)
+                     VALUES (?, ?, ?)
+                     ON CONFLICT(user_id) DO UPDATE SET
+                         last_settled = (production_rate * last_settled
+                                         + excluded.production_rate * excluded.last_settled)
+                                        / (production_rate + excluded.production_rate),
+                         production_rate = production_rate + excluded.production_rate''',
+                  (user_id, FACTORY_PRODUCTION_RATE, int(time.time())))
+    player_cache.invalidate(user_id)
+
+def purchase_factory(user_id, cost=FACTORY_COST):
+    """Покупает завод в одной транзакции: списывает его стоимость и строит завод.
+
+    Деньги списываются, только если их достаточно, поэтому завод без оплаты
+    или оплата без завода невозможны. Возвращает словарь с результатом, как
+    purchase_units.
+    """
+    result = {'success': False, 'reason': None, 'total_cost': cost}
+    
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute('''UPDATE players SET budget = budget - ? 
+                     WHERE user_id = ? AND budget >= ?''', (cost, user_id, cost))
+        if c.rowcount == 0:
+            c.execute('SELECT budget FROM players WHERE user_id = ?', (user_id,))
+            budget = c.fetchone()
+            result['reason'] = 'budget'
+            result['budget'] = budget[0] if budget else 0
+            return result
+        build_factory(user_id)
+    
+    player_cache.invalidate(user_id)
+    result['success'] = True
+    return result
+
+def _production_modifier(political_system):
+    """Модификатор производства от политической системы"""
+    return 1.0 + get_political_modifiers(political_system)[PRODUCTION]
+
+def _settle(production_rate, last_settled, current_time):
+    """Возвращает произведенное количество и новое время сбора.
+
+    Дробная часть продукции не теряется: время сбора сдвигается назад на
+    срок, за который она была произведена.
+    """
+    if production_rate <= 0:
+        return 0, current_time
+    accrued = max(current_time - last_settled, 0) * production_rate
+    return accrued // 3600, current_time - (accrued % 3600) // production_rate
 
 def calculate_production(user_id):
     """Рассчитывает производство пехотного вооружения за прошедшее время"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    
-    # Получаем все заводы игрока
-    c.execute('''SELECT last_production, production_rate 
-                 FROM factories 
-                 WHERE user_id = ?''', (user_id,))
-    factories = c.fetchall()
-    
-    total_production = 0
-    current_time = datetime.now()
-    current_time_str = current_time.strftime('%Y-%m-%d %H:%M:%S')
+    with transaction() as conn:
+        c = conn.cursor()
     
-    # Получаем модификатор производства от политической системы
-    from config.political_systems import get_political_system_effects
+        # Суммарная мощность заводов и время последнего сбора
+        c.execute('''SELECT production_rate, last_settled 
+                     FROM production_ledger 
+                     WHERE user_id = ?''', (user_id,))
+        ledger = c.fetchone()
+        if not ledger:
+            return 0
     
-    political_system = get_player_political_system(user_id)
-    production_modifier = 1.0
-    
-    if political_system:
-        effects = get_political_system_effects(political_system)
-        for key, value in effects.items():
-            if 'production' in key:
-                production_modifier += value
-    
-    for factory in factories:
-        # Если last_production NULL, используем текущее время
-        if factory[0] is None:
-            hours_passed = 0
-        else:
-            try:
-                # Пытаемся преобразовать строку в datetime
-                last_production = datetime.strptime(factory[0], '%Y-%m-%d %H:%M:%S')
-                hours_passed = (current_time - last_production).total_seconds() / 3600
-            except (ValueError, TypeError):
-                # Если не удалось преобразовать, считаем что завод только что создан
-                hours_passed = 0
-        
-        # Если production_rate NULL, используем значение по умолчанию
-        production_rate = factory[1] if factory[1] is not None else FACTORY_PRODUCTION_RATE
-        
         # Применяем модификатор от политической системы
-        production_rate = int(production_rate * production_modifier)
-        
-        production = int(hours_passed * production_rate)
-        total_production += production
-    
-    # Обновляем время последнего производства для всех заводов игрока
-    c.execute('''UPDATE factories 
-                 SET last_production = ? 
-                 WHERE user_id = ?''', (current_time_str, user_id))
+        production_modifier = _production_modifier(get_player_political_system(user_id))
+        production_rate = int(ledger[0] * production_modifier)
+        total_production, last_settled = _settle(production_rate, ledger[1], int(time.time()))
     
-    conn.commit()
-    conn.close()
+        c.execute('''UPDATE production_ledger 
+                     SET last_settled = ? 
+                     WHERE user_id = ?''', (last_settled, user_id))
     return total_production
 
+def settle_production(user_id):
+    """Рассчитывает производство и зачисляет его в инвентарь игрока"""
+    with transaction() as conn:
+        production = calculate_production(user_id)
+        if production:
+            conn.execute('''INSERT INTO inventory (user_id, item_type, quantity)
+                            VALUES (?, 'ammo', ?)
+                            ON CONFLICT(user_id, item_type) DO UPDATE SET quantity = quantity + excluded.quantity''',
+                         (user_id, production))
+    if production:
+        player_cache.invalidate(user_id)
+    return production
+
+def settle_all_production(dry_run=False):
+    """Зачисляет накопленное производство всем игрокам одним набором запросов.
+
+    Модификаторы политических систем подставляются в запрос выражением CASE,
+    поэтому время работы не зависит от количества заводов и почти не зависит
+    от количества игроков. При dry_run ничего не изменяется, а только
+    считается, сколько было бы зачислено.
+    """
+    from config.political_systems import POLITICAL_SYSTEMS
+    
+    modifier_case = 'CASE p.political_system ' + 'WHEN ? THEN ? ' * len(POLITICAL_SYSTEMS) + 'ELSE 1.0 END'
+    modifier_params = []
+    for system_id in POLITICAL_SYSTEMS:
+        modifier_params.extend([system_id, _production_modifier(system_id)])
+    
+    current_time = int(time.time())
+    # Эффективная мощность и накопленная продукция (в единицах * 3600), как в _settle
+    accrued_query = f'''SELECT l.user_id, rate,
+                               MAX(? - l.last_settled, 0) * rate AS accrued
+                        FROM (SELECT l.user_id, l.last_settled,
+                                     CAST(l.production_rate * {modifier_case} AS INTEGER) AS rate
+                              FROM production_ledger l
+                              LEFT JOIN players p ON p.user_id = l.user_id) AS l
+                        WHERE rate > 0'''
+    params = [current_time] + modifier_params
+    
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute(f'''SELECT COUNT(*), COALESCE(SUM(accrued / 3600), 0)
+                     FROM ({accrued_query}) WHERE accrued >= 3600''', params)
+        players, produced = c.fetchone()
+        if dry_run or not players:
+            return {'players': players, 'produced': produced}
+    
+        c.execute(f'''CREATE TEMP TABLE production_tick AS
+                     SELECT user_id, accrued / 3600 AS produced,
+                            ? - (accrued % 3600) / rate AS last_settled
+                     FROM ({accrued_query}) WHERE accrued >= 3600''', [current_time] + params)
+        try:
+            c.execute('''INSERT OR IGNORE INTO inventory (user_id, item_type, quantity)
+                         SELECT user_id, 'ammo', 0 FROM production_tick''')
+            c.execute('''UPDATE inventory SET quantity = quantity + t.produced
+                         FROM production_tick AS t
+                         WHERE inventory.user_id = t.user_id AND inventory.item_type = ?''', ('ammo',))
+            c.execute('''UPDATE production_ledger SET last_settled = t.last_settled
+                         FROM production_tick AS t
+                         WHERE production_ledger.user_id = t.user_id''')
+        finally:
+            c.execute('DROP TABLE production_tick')
+    player_cache.clear()
+    return {'players': players, 'produced': produced}
+
 # Функции для работы с боевой системой
 def log_battle(attacker_id, defender_id, attacker_troops, defender_troops,
                attacker_losses, defender_losses, winner_id):
     """Записывает информацию о бое в базу данных"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('''INSERT INTO battle_history
-                 (attacker_id, defender_id, attacker_troops, defender_troops,
-                  attacker_losses, defender_losses, winner_id)
-                 VALUES (?, ?, ?, ?, ?, ?, ?)''',
-              (attacker_id, defender_id, attacker_troops, defender_troops,
-               attacker_losses, defender_losses, winner_id))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO battle_history
+                     (attacker_id, defender_id, attacker_troops, defender_troops,
+                      attacker_losses, defender_losses, winner_id)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                  (attacker_id, defender_id, attacker_troops, defender_troops,
+                   attacker_losses, defender_losses, winner_id))
+        conn.commit()
 
-def get_battle_history(user_id, limit=5):
-    """Получает историю боев игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    
-    c.execute('''
+def resolve_battle(attacker_id, defender_id, attacker_losses, defender_losses,
+                   attacker_troops, defender_troops, winner_id):
+    """Применяет потери обеих сторон и записывает бой в историю в одной транзакции"""
+    losses = []
+    for user_id, unit_losses in ((attacker_id, attacker_losses), (defender_id, defender_losses)):
+        for unit_type, loss in unit_losses.items():
+            if loss > 0:
+                losses.append((loss, user_id, unit_type))
+    
+    with transaction() as conn:
+        c = conn.cursor()
+        c.executemany('''UPDATE inventory SET quantity = MAX(quantity - ?, 0) 
+                         WHERE user_id = ? AND item_type = ?''', losses)
+        c.execute('''INSERT INTO battle_history
+                     (attacker_id, defender_id, attacker_troops, defender_troops,
+                      attacker_losses, defender_losses, winner_id)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                  (attacker_id, defender_id, attacker_troops, defender_troops,
+                   sum(attacker_losses.values()), sum(defender_losses.values()), winner_id))
+        _refresh_player_power(c, attacker_id, defender_id)
+    player_cache.invalidate(attacker_id, defender_id)
+
+def get_battle_history_page(user_id, cursor=None, newer=False, limit=5):
+    """Получает страницу истории боев игрока, начиная от курсора.
+
+    Курсор - пара (battle_date, id) боя на границе текущей страницы. Без курсора
+    возвращаются самые новые бои; newer=False листает к более старым боям,
+    newer=True - к более новым. Бои атакующего и защищающегося выбираются
+    отдельно по своим индексам и объединяются через UNION ALL, поэтому
+    стоимость страницы не зависит от длины истории.
+
+    Возвращает (бои, есть_еще), бои всегда упорядочены от новых к старым.
+    """
+    if cursor is None:
+        condition, params = '', []
+    else:
+        condition = 'AND (battle_date, id) > (?, ?)' if newer else 'AND (battle_date, id) < (?, ?)'
+        params = list(cursor)
+    order = 'ASC' if newer else 'DESC'
+    
+    # Каждая ветка берет не больше limit + 1 боев по своему индексу
+    branch = f'''SELECT * FROM (SELECT id, battle_date, attacker_id, defender_id, attacker_troops,
+                                         defender_troops, attacker_losses, defender_losses, winner_id
+                                  FROM battle_history
+                                  WHERE {{column}} = ? {{extra}} {condition}
+                                  ORDER BY battle_date {order}, id {order}
+                                  LIMIT ?)'''
+    query = f'''
         SELECT 
+            bh.id,
             bh.battle_date,
             p1.username as attacker,
             p2.username as defender,
@@ -377,111 +542,122 @@ def get_battle_history(user_id, limit=5):
                 WHEN bh.winner_id = bh.attacker_id THEN p1.username
                 ELSE p2.username
             END as winner
-        FROM battle_history bh
+        FROM ({branch.format(column='attacker_id', extra='')}
+              UNION ALL
+              {branch.format(column='defender_id', extra='AND attacker_id != defender_id')}) bh
         JOIN players p1 ON bh.attacker_id = p1.user_id
         JOIN players p2 ON bh.defender_id = p2.user_id
-        WHERE bh.attacker_id = ? OR bh.defender_id = ?
-        ORDER BY bh.battle_date DESC
+        ORDER BY bh.battle_date {order}, bh.id {order}
         LIMIT ?
-    ''', (user_id, user_id, limit))
-    
-    battles = c.fetchall()
-    conn.close()
-    return battles
+    '''
+    branch_params = [user_id] + params + [limit + 1]
+    
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(query, branch_params + branch_params + [limit + 1])
+        battles = c.fetchall()
+    
+    has_more = len(battles) > limit
+    battles = battles[:limit]
+    if newer:
+        battles.reverse()
+    return battles, has_more
+
+def get_battle_history(user_id, limit=5):
+    """Получает историю боев игрока"""
+    battles, _ = get_battle_history_page(user_id, limit=limit)
+    return [battle[1:] for battle in battles]
+
+def get_leaderboard_page(cursor=None, newer=False, limit=10):
+    """Получает страницу рейтинга игроков по боевой мощи.
+
+    Курсор - пара (power, user_id) игрока на границе текущей страницы, листание
+    устроено так же, как в get_battle_history_page. Страница читается по
+    индексу idx_player_power_rank, поэтому ее стоимость не зависит от
+    количества игроков. Игроки без войск в рейтинг не попадают.
+
+    Возвращает (игроки, есть_еще), игроки - (user_id, username, country, power)
+    от сильных к слабым.
+    """
+    if cursor is None:
+        condition, params = '', []
+    else:
+        condition = 'AND (pp.power, pp.user_id) > (?, ?)' if newer else 'AND (pp.power, pp.user_id) < (?, ?)'
+        params = list(cursor)
+    order = 'ASC' if newer else 'DESC'
+    
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(f'''SELECT pp.user_id, p.username, p.country, pp.power
+                      FROM player_power pp
+                      JOIN players p ON p.user_id = pp.user_id
+                      WHERE pp.power > 0 {condition}
+                      ORDER BY pp.power {order}, pp.user_id {order}
+                      LIMIT ?''', params + [limit + 1])
+        players = c.fetchall()
+    
+    has_more = len(players) > limit
+    players = players[:limit]
+    if newer:
+        players.reverse()
+    return players, has_more
 
 # Функции для работы с регионами стран
 def get_player_regions(user_id):
     """Получает список регионов игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('SELECT regions FROM players WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    
-    if result and result[0]:
-        return result[0].split(',')
-    else:
-        return []
+    return list(get_player_state(user_id).regions)
 
 def set_player_regions(user_id, regions_list):
-    """Устанавливает список регионов игрока"""
-    regions_str = ','.join(regions_list) if regions_list else ''
-    
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('UPDATE players SET regions = ? WHERE user_id = ?', (regions_str, user_id))
-    conn.commit()
-    conn.close()
+    """Устанавливает список контролируемых регионов игрока"""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('''UPDATE country_regions 
+                     SET is_controlled = region_id IN (SELECT value FROM json_each(?)) 
+                     WHERE user_id = ?''', (json.dumps(list(regions_list or [])), user_id))
+        conn.commit()
+    player_cache.invalidate(user_id)
 
 def get_player_controlled_regions(user_id):
     """Получает детальную информацию о контролируемых регионах игрока"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('''SELECT cr.region_id, cr.is_damaged, cr.damage_level 
-                 FROM country_regions cr
-                 WHERE cr.user_id = ? AND cr.is_controlled = 1''', (user_id,))
-    regions = c.fetchall()
-    conn.close()
-    
-    return regions
+    region_states = get_player_state(user_id).region_states
+    return [(region_id, int(status['is_damaged']), status['damage_level'])
+            for region_id, status in region_states.items() if status['is_controlled']]
+
+def get_region_states(user_id):
+    """Получает состояние (контроль и повреждения) всех регионов игрока"""
+    region_states = get_player_state(user_id).region_states
+    return {region_id: dict(status) for region_id, status in region_states.items()}
 
 def get_region_control_status(user_id, region_id):
     """Проверяет, контролирует ли игрок указанный регион"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('''SELECT is_controlled, is_damaged, damage_level 
-                 FROM country_regions 
-                 WHERE user_id = ? AND region_id = ?''', (user_id, region_id))
-    result = c.fetchone()
-    conn.close()
-    
-    if result:
-        return {
-            'is_controlled': bool(result[0]),
-            'is_damaged': bool(result[1]),
-            'damage_level': result[2]
-        }
-    else:
-        return None
+    status = get_player_state(user_id).region_states.get(region_id)
+    return dict(status) if status else None
 
 def change_region_control(user_id, region_id, is_controlled=True):
     """Изменяет статус контроля региона"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    
-    # Обновляем статус контроля региона
-    c.execute('''UPDATE country_regions 
-                 SET is_controlled = ? 
-                 WHERE user_id = ? AND region_id = ?''', 
-              (1 if is_controlled else 0, user_id, region_id))
-    
-    # Обновляем список регионов в players, если статус изменился
-    if c.rowcount > 0:
-        # Получаем обновленный список контролируемых регионов
-        c.execute('''SELECT region_id 
-                     FROM country_regions 
-                     WHERE user_id = ? AND is_controlled = 1''', (user_id,))
-        controlled_regions = [row[0] for row in c.fetchall()]
-        
-        # Обновляем поле regions
-        regions_str = ','.join(controlled_regions)
-        c.execute('UPDATE players SET regions = ? WHERE user_id = ?', (regions_str, user_id))
+    with get_connection() as conn:
+        c = conn.cursor()
     
-    conn.commit()
-    conn.close()
+        # Обновляем статус контроля региона
+        c.execute('''UPDATE country_regions 
+                     SET is_controlled = ? 
+                     WHERE user_id = ? AND region_id = ?''', 
+                  (1 if is_controlled else 0, user_id, region_id))
+        conn.commit()
+    player_cache.invalidate(user_id)
     
     return c.rowcount > 0
 
 def set_region_damage(user_id, region_id, is_damaged=True, damage_level=1):
     """Устанавливает статус повреждения региона"""
-    conn = sqlite3.connect('vpi.db')
-    c = conn.cursor()
-    c.execute('''UPDATE country_regions 
-                 SET is_damaged = ?, damage_level = ? 
-                 WHERE user_id = ? AND region_id = ?''', 
-              (1 if is_damaged else 0, damage_level, user_id, region_id))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('''UPDATE country_regions 
+                     SET is_damaged = ?, damage_level = ? 
+                     WHERE user_id = ? AND region_id = ?''', 
+                  (1 if is_damaged else 0, damage_level, user_id, region_id))
+        conn.commit()
+    player_cache.invalidate(user_id)
     
     return c.rowcount > 0
 
@@ -489,19 +665,46 @@ def repair_region(user_id, region_id):
     """Восстанавливает регион после повреждения"""
     return set_region_damage(user_id, region_id, False, 0)
 
+def check_regions_consistency():
+    """Проверяет согласованность регионов игроков с их странами.
+
+    Возвращает словарь со списками найденных проблем:
+    missing - (user_id, country, region_id): у игрока нет записи региона своей страны;
+    unknown - (user_id, country, region_id): запись региона, которого нет в конфигурации страны;
+    orphaned - (user_id, country): записи регионов страны, которую игрок больше не выбирает.
+    """
+    from config.regions import COUNTRY_REGIONS
+    
+    problems = {'missing': [], 'unknown': [], 'orphaned': []}
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('''SELECT p.user_id, p.country, cr.region_id
+                     FROM players p
+                     LEFT JOIN country_regions cr ON cr.user_id = p.user_id AND cr.country = p.country
+                     WHERE p.country IS NOT NULL''')
+        player_regions = {}
+        for user_id, country, region_id in c.fetchall():
+            regions = player_regions.setdefault((user_id, country), set())
+            if region_id is not None:
+                regions.add(region_id)
+        
+        c.execute('''SELECT DISTINCT cr.user_id, cr.country
+                     FROM country_regions cr
+                     LEFT JOIN players p ON p.user_id = cr.user_id
+                     WHERE p.country IS NULL OR p.country != cr.country''')
+        problems['orphaned'] = c.fetchall()
+    
+    for (user_id, country), regions in player_regions.items():
+        expected = set(COUNTRY_REGIONS.get(country, {}))
+        problems['missing'].extend((user_id, country, region_id) for region_id in sorted(expected - regions))
+        problems['unknown'].extend((user_id, country, region_id) for region_id in sorted(regions - expected))
+    return problems
+
 def get_adjusted_economic_bonus(user_id):
     """Возвращает скорректированный экономический бонус с учетом регионов и политической системы"""
-    from config.political_systems import get_political_system_effects
-    
     # Получаем бонус от политической системы
     political_system = get_player_political_system(user_id)
-    political_modifier = 0.0
-    
-    if political_system:
-        effects = get_political_system_effects(political_system)
-        for key, value in effects.items():
-            if 'economy' in key:
-                political_modifier += value
+    political_modifier = get_political_modifiers(political_system)[ECONOMY]
     
     # Бонусы от регионов нулевые, так как система зданий еще не реализована
     # Когда система зданий будет реализована, регионы будут давать бонусы
@@ -511,17 +714,9 @@ def get_adjusted_economic_bonus(user_id):
 
 def get_adjusted_production_with_regions(user_id, base_rate):
     """Возвращает скорректированное значение производства с учетом регионов и политической системы"""
-    from config.political_systems import get_political_system_effects
-    
     # Базовый модификатор от политической системы
     political_system = get_player_political_system(user_id)
-    political_modifier = 0.0
-    
-    if political_system:
-        effects = get_political_system_effects(political_system)
-        for key, value in effects.items():
-            if 'production' in key:
-                political_modifier += value
+    political_modifier = get_political_modifiers(political_system)[PRODUCTION]
     
     # Бонусы от регионов нулевые, так как система зданий еще не реализована
     # Когда система зданий будет реализована, регионы будут давать бонусы
@@ -533,17 +728,9 @@ def get_adjusted_production_with_regions(user_id, base_rate):
 
 def get_adjusted_military_power_with_regions(user_id, base_power):
     """Возвращает скорректированное значение боевой мощи с учетом регионов и политической системы"""
-    from config.political_systems import get_political_system_effects
-    
     # Бонус от политической системы
     political_system = get_player_political_system(user_id)
-    political_modifier = 0.0
-    
-    if political_system:
-        effects = get_political_system_effects(political_system)
-        for key, value in effects.items():
-            if 'military' in key:
-                political_modifier += value
+    political_modifier = get_political_modifiers(political_system)[MILITARY]
     
     # Бонусы от регионов нулевые, так как система зданий еще не реализована
     # Когда система зданий будет реализована, регионы будут давать бонусы
@@ -0,0 +1,148 @@
+import sqlite3
+import threading
+import queue
+import logging
+from contextlib import contextmanager
+from config.config import (DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_BUSY_TIMEOUT,
+                           DB_SYNCHRONOUS, DB_CACHE_SIZE, DB_MMAP_SIZE, DB_TEMP_STORE,
+                           DB_WAL_AUTOCHECKPOINT)
+
+logger = logging.getLogger('vpi')
+
+# PRAGMA, которые применяются один раз при создании соединения
+CONNECTION_PRAGMAS = [
+    ('busy_timeout', DB_BUSY_TIMEOUT),
+    ('synchronous', DB_SYNCHRONOUS),
+    ('cache_size', DB_CACHE_SIZE),
+    ('mmap_size', DB_MMAP_SIZE),
+    ('temp_store', DB_TEMP_STORE),
+    ('wal_autocheckpoint', DB_WAL_AUTOCHECKPOINT),
+]
+
+class ConnectionPool:
+    """Пул соединений SQLite с привязкой к потокам.
+
+    Соединение выдается потоку целиком: пока поток держит соединение,
+    повторные запросы из того же потока (вложенные вызовы функций db)
+    получают то же самое соединение, а другие потоки - другое.
+    """
+
+    def __init__(self, path=DB_PATH, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self.created = 0
+        self.checkouts = 0
+
+    def _create_connection(self):
+        """Открывает новое соединение и применяет PRAGMA"""
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT / 1000, check_same_thread=False)
+        for name, value in CONNECTION_PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        with self._lock:
+            self._connections.append(conn)
+            self.created += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Выдает соединение из пула и возвращает его обратно после использования"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            # Поток уже держит соединение - переиспользуем его
+            yield held
+            return
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError(
+                f"Нет свободных соединений в пуле ({self.size}) за {self.timeout} с")
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._create_connection()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.checkouts += 1
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            # Незавершенная транзакция не должна достаться следующему владельцу
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+            self._slots.release()
+
+    def close_all(self):
+        """Закрывает все соединения пула"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._idle = queue.LifoQueue()
+
+    def stats(self):
+        """Возвращает статистику использования пула"""
+        return {
+            'size': self.size,
+            'created': self.created,
+            'idle': self._idle.qsize(),
+            'checkouts': self.checkouts
+        }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def init_pool(path=DB_PATH, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+    """Создает (или пересоздает) глобальный пул соединений"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = ConnectionPool(path, size, timeout)
+        logger.info(f"Пул соединений с базой {path} создан (размер: {size})")
+    return _pool
+
+def get_pool():
+    """Возвращает глобальный пул соединений, создавая его при первом обращении"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+def get_connection():
+    """Контекстный менеджер для получения соединения из глобального пула"""
+    return get_pool().connection()
+
+@contextmanager
+def transaction(immediate=True):
+    """Выполняет блок в одной транзакции: фиксирует ее при успехе и откатывает при ошибке.
+
+    BEGIN IMMEDIATE сразу захватывает блокировку записи, поэтому
+    параллельные транзакции не могут прочитать устаревшие данные
+    между проверкой и изменением.
+    """
+    with get_connection() as conn:
+        if conn.in_transaction:
+            # Вложенный вызов - работаем внутри внешней транзакции
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
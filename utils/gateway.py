@@ -0,0 +1,94 @@
+"""Настройки подключения бота к шлюзу Discord: интенты и кэш участников.
+
+Профиль 'lean' подписывается только на события, которые нужны командам бота
+(сообщения с содержимым для префиксных команд, серверы и участники для
+конвертера discord.Member и создания игроков), не получает обновления
+статусов и не хранит участников серверов в памяти. Участники загружаются по
+запросу (Guild.chunk) при добавлении бота на сервер.
+
+Профиль 'full' соответствует прежнему поведению: все интенты и полный кэш
+участников с загрузкой при запуске.
+
+Здесь же разбираются настройки шардирования (SHARDING_MODE в config/config.py).
+"""
+import discord
+
+GATEWAY_PROFILES = ('lean', 'full')
+
+def build_intents(profile):
+    """Интенты для профиля"""
+    if profile == 'full':
+        return discord.Intents.all()
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.dm_messages = True
+    intents.message_content = True
+    # Нужен конвертеру discord.Member и Guild.chunk
+    intents.members = True
+    return intents
+
+def build_member_cache_flags(profile, intents):
+    """Политика кэширования участников для профиля"""
+    if profile == 'full':
+        return discord.MemberCacheFlags.from_intents(intents)
+    # Бот сам всегда остается в кэше сервера
+    return discord.MemberCacheFlags.none()
+
+def gateway_options(profile):
+    """Параметры commands.Bot для профиля"""
+    if profile not in GATEWAY_PROFILES:
+        raise ValueError(f"Неизвестный профиль шлюза: {profile}")
+    intents = build_intents(profile)
+    return {
+        'intents': intents,
+        'member_cache_flags': build_member_cache_flags(profile, intents),
+        'chunk_guilds_at_startup': profile == 'full'
+    }
+
+async def get_guild_members(guild):
+    """Участники сервера: из кэша, если он полный, иначе загружаются без кэширования"""
+    if guild.chunked:
+        return guild.members
+    return await guild.chunk(cache=False)
+
+def parse_shard_ids(value):
+    """Разбирает список шардов вида '0-3' или '0,2,5' в список номеров"""
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    shard_ids = []
+    for part in str(value).split(','):
+        part = part.strip()
+        if '-' in part:
+            first, last = part.split('-')
+            shard_ids.extend(range(int(first), int(last) + 1))
+        elif part:
+            shard_ids.append(int(part))
+    return shard_ids
+
+def sharding_options(mode, shard_count=None, shard_ids=None):
+    """Параметры шардирования для commands.AutoShardedBot.
+
+    Возвращает None, если бот работает без шардов. Для режима 'range'
+    нужны и количество шардов, и номера шардов этого процесса.
+    """
+    if shard_ids is not None:
+        mode = 'range'
+    if mode == 'none':
+        return None
+    if mode == 'auto':
+        return {'shard_count': int(shard_count)} if shard_count else {}
+    if mode != 'range':
+        raise ValueError(f"Неизвестный режим шардирования: {mode}")
+    if not shard_count or shard_ids is None:
+        raise ValueError("Для режима 'range' нужно указать SHARD_COUNT и SHARD_IDS")
+    shard_count = int(shard_count)
+    shard_ids = parse_shard_ids(shard_ids)
+    if not shard_ids or any(shard_id < 0 or shard_id >= shard_count for shard_id in shard_ids):
+        raise ValueError(f"Номера шардов {shard_ids} должны быть от 0 до {shard_count - 1}")
+    return {'shard_count': shard_count, 'shard_ids': shard_ids}
+
+def is_primary_process(bot):
+    """Процесс, выполняющий фоновые задачи: без явного списка шардов или с шардом 0"""
+    shard_ids = getattr(bot, 'shard_ids', None)
+    return shard_ids is None or 0 in shard_ids
@@ -0,0 +1,65 @@
+import asyncio
+import time
+import logging
+from contextlib import asynccontextmanager
+from utils.metrics import metrics
+
+logger = logging.getLogger('vpi')
+
+class PlayerLocks:
+    """Блокировки по user_id для команд, изменяющих состояние игрока.
+
+    Команды одного игрока (или двух игроков в бою) выполняются по очереди.
+    Блокировки нескольких игроков всегда берутся в порядке возрастания
+    user_id, поэтому две встречные атаки не могут заблокировать друг друга.
+    Неиспользуемые блокировки удаляются, чтобы словарь не рос бесконечно.
+
+    Блокировки действуют только внутри процесса. Когда шарды работают в
+    нескольких процессах с общей базой, корректность обеспечивают сами
+    функции записи utils/db.py: они изменяют деньги и инвентарь
+    относительно текущего значения в базе (с проверкой остатка в той же
+    транзакции), а не записывают значение, прочитанное раньше.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._users = {}
+
+    def _get_lock(self, user_id):
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        self._users[user_id] = self._users.get(user_id, 0) + 1
+        return lock
+
+    def _release_lock(self, user_id):
+        self._users[user_id] -= 1
+        if self._users[user_id] == 0:
+            del self._users[user_id]
+            del self._locks[user_id]
+
+    @asynccontextmanager
+    async def acquire(self, *user_ids):
+        """Захватывает блокировки всех указанных игроков"""
+        user_ids = sorted(set(user_ids))
+        locks = [self._get_lock(user_id) for user_id in user_ids]
+        acquired = []
+        start = time.perf_counter()
+        try:
+            for lock in locks:
+                if lock.locked():
+                    metrics.increment('locks.player_contended')
+                await lock.acquire()
+                acquired.append(lock)
+            metrics.observe('locks.player_wait_ms', (time.perf_counter() - start) * 1000)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+            for user_id in user_ids:
+                self._release_lock(user_id)
+
+    def __len__(self):
+        return len(self._locks)
+
+player_locks = PlayerLocks()
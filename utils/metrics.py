@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger('vpi')
+
+# Количество последних значений, по которым считаются перцентили
+SAMPLES_LIMIT = 1000
+
+class Metrics:
+    """Простой потокобезопасный реестр счетчиков и замеров времени"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timings = {}
+
+    def increment(self, name, value=1):
+        """Увеличивает счетчик"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """Добавляет замер (обычно в миллисекундах)"""
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = {
+                    'count': 0,
+                    'total': 0.0,
+                    'max': 0.0,
+                    'samples': deque(maxlen=SAMPLES_LIMIT)
+                }
+            timing['count'] += 1
+            timing['total'] += value
+            timing['max'] = max(timing['max'], value)
+            timing['samples'].append(value)
+
+    def snapshot(self):
+        """Возвращает копию всех метрик"""
+        with self._lock:
+            timings = {}
+            for name, timing in self.timings.items():
+                samples = sorted(timing['samples'])
+                timings[name] = {
+                    'count': timing['count'],
+                    'avg': timing['total'] / timing['count'],
+                    'p95': samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1],
+                    'max': timing['max']
+                }
+            return {'counters': dict(self.counters), 'timings': timings}
+
+    def reset(self):
+        """Сбрасывает все метрики"""
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+
+metrics = Metrics()
+
+class LoopBlockMonitor:
+    """Измеряет, как долго цикл событий asyncio был заблокирован.
+
+    Фоновая задача засыпает на короткий интервал и смотрит, насколько
+    позже положенного она проснулась. Суммарное опоздание - это время,
+    в течение которого цикл выполнял синхронный код и не мог обслуживать
+    другие задачи (в том числе heartbeat шлюза Discord).
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.blocked = 0.0
+        self._task = None
+
+    def start(self):
+        """Запускает мониторинг в текущем цикле событий"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+            if lag > 0:
+                self.blocked += lag
+                metrics.observe('event_loop.lag_ms', lag * 1000)
+
+loop_monitor = LoopBlockMonitor()
+
+def command_started(ctx):
+    """Запоминает состояние счетчиков в начале команды"""
+    ctx.metrics_started = (time.perf_counter(), loop_monitor.blocked)
+
+def command_finished(ctx):
+    """Записывает длительность команды и время блокировки цикла событий за время ее выполнения"""
+    started = getattr(ctx, 'metrics_started', None)
+    if started is None or ctx.command is None:
+        return
+    start_time, start_blocked = started
+    name = ctx.command.qualified_name
+    metrics.observe(f'command.{name}.duration_ms', (time.perf_counter() - start_time) * 1000)
+    metrics.observe(f'command.{name}.loop_blocked_ms', (loop_monitor.blocked - start_blocked) * 1000)
@@ -0,0 +1,250 @@
+"""Версионные миграции схемы базы данных.
+
+Номер текущей версии схемы хранится в PRAGMA user_version. Каждая миграция
+выполняется в отдельной транзакции вместе с увеличением номера версии,
+поэтому прерванная миграция не оставляет схему в промежуточном состоянии.
+Шаги написаны идемпотентно: базы, созданные до появления миграций (версия 0),
+уже содержат часть таблиц и колонок, и повторное создание должно их
+пропускать. При запуске на актуальной базе выполняется только чтение версии.
+
+Новые изменения схемы добавляются в конец MIGRATIONS со следующим номером.
+Уже выпущенные шаги не изменяются.
+"""
+import time
+import logging
+from datetime import datetime
+from config.config import FACTORY_PRODUCTION_RATE
+from utils.db_pool import get_connection, transaction
+from utils.battle_engine import army_from_inventory, armies_power
+
+logger = logging.getLogger('vpi')
+
+def _add_column(c, table, column, definition):
+    """Добавляет колонку, если ее еще нет"""
+    c.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in c.fetchall()]:
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        logger.info(f"Добавлена колонка {column} в таблицу {table}")
+
+def _base_schema(c):
+    """Основные таблицы игры"""
+    c.execute('''CREATE TABLE IF NOT EXISTS players
+                 (user_id INTEGER PRIMARY KEY,
+                  username TEXT,
+                  budget INTEGER DEFAULT 1000000,
+                  country TEXT,
+                  political_system TEXT,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    # Колонки, которые раньше добавлялись скриптами update_db.py и update_regions_db.py
+    _add_column(c, 'players', 'political_system', 'TEXT')
+    _add_column(c, 'players', 'regions', 'TEXT')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS inventory
+                 (user_id INTEGER,
+                  item_type TEXT,
+                  quantity INTEGER,
+                  FOREIGN KEY (user_id) REFERENCES players(user_id),
+                  PRIMARY KEY (user_id, item_type))''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS battle_history
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  attacker_id INTEGER,
+                  defender_id INTEGER,
+                  attacker_troops INTEGER,
+                  defender_troops INTEGER,
+                  attacker_losses INTEGER,
+                  defender_losses INTEGER,
+                  winner_id INTEGER,
+                  battle_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                  FOREIGN KEY (attacker_id) REFERENCES players(user_id),
+                  FOREIGN KEY (defender_id) REFERENCES players(user_id))''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS factories
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  production_rate INTEGER NOT NULL DEFAULT 1000,
+                  last_production TEXT,
+                  FOREIGN KEY (user_id) REFERENCES players(user_id))''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS country_regions
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  country TEXT,
+                  region_id TEXT,
+                  is_controlled BOOLEAN DEFAULT 1,
+                  is_damaged BOOLEAN DEFAULT 0,
+                  damage_level INTEGER DEFAULT 0,
+                  FOREIGN KEY (user_id) REFERENCES players(user_id))''')
+
+    # Заводы, созданные старыми версиями бота без мощности или времени производства
+    c.execute('''UPDATE factories
+                 SET production_rate = COALESCE(production_rate, ?),
+                     last_production = COALESCE(last_production, ?)
+                 WHERE production_rate IS NULL OR last_production IS NULL''',
+              (FACTORY_PRODUCTION_RATE, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+def _player_regions(c):
+    """Регионы для игроков, выбравших страну до появления регионов"""
+    from config.regions import COUNTRY_REGIONS
+
+    c.execute('''SELECT user_id, country FROM players p
+                 WHERE country IS NOT NULL
+                   AND NOT EXISTS (SELECT 1 FROM country_regions cr WHERE cr.user_id = p.user_id)''')
+    players = c.fetchall()
+    for user_id, country in players:
+        regions = list(COUNTRY_REGIONS.get(country, {}))
+        if not regions:
+            continue
+        c.executemany('''INSERT INTO country_regions (user_id, country, region_id, is_controlled)
+                         VALUES (?, ?, ?, 1)''', [(user_id, country, region_id) for region_id in regions])
+        c.execute('UPDATE players SET regions = ? WHERE user_id = ?', (','.join(regions), user_id))
+    if players:
+        logger.info(f"Добавлены регионы для {len(players)} игроков")
+
+def _production_ledger(c):
+    """Сводная таблица производства: суммарная мощность заводов и время последнего сбора.
+
+    Время сбора при заполнении берется как среднее времен заводов, взвешенное
+    по мощности: тогда rate * (now - last_settled) совпадает с суммой
+    накопленного по каждому заводу, и уже накопленная продукция не теряется.
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS production_ledger
+                 (user_id INTEGER PRIMARY KEY,
+                  production_rate INTEGER NOT NULL DEFAULT 0,
+                  last_settled INTEGER NOT NULL,
+                  FOREIGN KEY (user_id) REFERENCES players(user_id))''')
+
+    c.execute('''SELECT f.user_id, f.last_production, f.production_rate
+                 FROM factories f
+                 LEFT JOIN production_ledger l ON l.user_id = f.user_id
+                 WHERE l.user_id IS NULL''')
+    ledger = {}
+    now = int(time.time())
+    for user_id, last_production, production_rate in c.fetchall():
+        if production_rate is None:
+            production_rate = FACTORY_PRODUCTION_RATE
+        try:
+            settled = int(datetime.strptime(last_production, '%Y-%m-%d %H:%M:%S').timestamp())
+        except (ValueError, TypeError):
+            settled = now
+        total_rate, weighted = ledger.get(user_id, (0, 0))
+        ledger[user_id] = (total_rate + production_rate, weighted + production_rate * settled)
+
+    if ledger:
+        c.executemany('''INSERT INTO production_ledger (user_id, production_rate, last_settled)
+                         VALUES (?, ?, ?)''',
+                      [(user_id, total_rate, weighted // total_rate if total_rate else now)
+                       for user_id, (total_rate, weighted) in ledger.items()])
+        logger.info(f"Заполнена сводная таблица производства для {len(ledger)} игроков")
+
+def _battle_daily_stats(c):
+    """Сводка архивированных боев по дням (см. utils/archive.py)"""
+    c.execute('''CREATE TABLE IF NOT EXISTS battle_daily_stats
+                 (user_id INTEGER,
+                  day TEXT,
+                  battles INTEGER NOT NULL DEFAULT 0,
+                  wins INTEGER NOT NULL DEFAULT 0,
+                  defeats INTEGER NOT NULL DEFAULT 0,
+                  troops INTEGER NOT NULL DEFAULT 0,
+                  losses INTEGER NOT NULL DEFAULT 0,
+                  PRIMARY KEY (user_id, day))''')
+
+def _indexes(c):
+    """Индексы для запросов по игроку"""
+    # Уникальный индекс не создастся, пока в таблице есть повторы регионов:
+    # оставляем первую запись, как это делал бы INSERT OR IGNORE
+    c.execute('''DELETE FROM country_regions
+                 WHERE id NOT IN (SELECT MIN(id) FROM country_regions GROUP BY user_id, region_id)''')
+    if c.rowcount > 0:
+        logger.info(f"Удалено повторяющихся записей регионов: {c.rowcount}")
+
+    c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_country_regions_user_region
+                 ON country_regions (user_id, region_id)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_country_regions_user_controlled
+                 ON country_regions (user_id, is_controlled, region_id)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_factories_user
+                 ON factories (user_id)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_battle_history_attacker_date
+                 ON battle_history (attacker_id, battle_date)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_battle_history_defender_date
+                 ON battle_history (defender_id, battle_date)''')
+
+def _normalize_player_regions(c):
+    """Таблица country_regions становится единственным источником регионов игрока.
+
+    Регионы из колонки players.regions, для которых нет записи в таблице,
+    переносятся в нее, после чего колонка очищается. Сама колонка остается,
+    так как DROP COLUMN поддерживается не всеми версиями SQLite.
+    """
+    c.execute('''SELECT user_id, country, regions FROM players
+                 WHERE country IS NOT NULL AND length(regions) > 0''')
+    rows = [(user_id, country, region_id)
+            for user_id, country, regions in c.fetchall()
+            for region_id in regions.split(',') if region_id]
+    c.executemany('''INSERT OR IGNORE INTO country_regions (user_id, country, region_id, is_controlled)
+                     VALUES (?, ?, ?, 1)''', rows)
+    if c.rowcount > 0:
+        logger.info(f"Перенесено регионов из players.regions: {c.rowcount}")
+    c.execute('UPDATE players SET regions = NULL WHERE regions IS NOT NULL')
+
+def _player_power(c):
+    """Боевая мощь игроков для рейтинга, поддерживается при каждом изменении инвентаря"""
+    c.execute('''CREATE TABLE IF NOT EXISTS player_power
+                 (user_id INTEGER PRIMARY KEY,
+                  power INTEGER NOT NULL DEFAULT 0,
+                  FOREIGN KEY (user_id) REFERENCES players(user_id))''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_player_power_rank
+                 ON player_power (power, user_id)''')
+
+    c.execute('SELECT user_id, item_type, quantity FROM inventory')
+    inventories = {}
+    for user_id, item_type, quantity in c.fetchall():
+        inventories.setdefault(user_id, {})[item_type] = quantity
+    # Мощь всех игроков считается одной пачкой
+    powers = armies_power([army_from_inventory(inventory) for inventory in inventories.values()])
+    c.executemany('INSERT OR REPLACE INTO player_power (user_id, power) VALUES (?, ?)',
+                  zip(inventories, powers))
+    if inventories:
+        logger.info(f"Рассчитана боевая мощь {len(inventories)} игроков")
+
+def _drop_controlled_index(c):
+    """Индекс по is_controlled не нужен: регионы игрока читаются целиком по user_id"""
+    c.execute('DROP INDEX IF EXISTS idx_country_regions_user_controlled')
+
+# Миграции в порядке применения: (версия, описание, функция)
+MIGRATIONS = [
+    (1, 'основные таблицы', _base_schema),
+    (2, 'регионы игроков', _player_regions),
+    (3, 'сводная таблица производства', _production_ledger),
+    (4, 'сводка архивированных боев', _battle_daily_stats),
+    (5, 'индексы', _indexes),
+    (6, 'регионы игроков только в country_regions', _normalize_player_regions),
+    (7, 'боевая мощь игроков', _player_power),
+    (8, 'удаление индекса регионов по контролю', _drop_controlled_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    """Возвращает текущую версию схемы базы"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate():
+    """Применяет недостающие миграции и возвращает итоговую версию схемы"""
+    with get_connection() as conn:
+        version = get_schema_version(conn)
+        if version > LATEST_VERSION:
+            logger.warning(f"Версия схемы базы ({version}) новее, чем известно боту ({LATEST_VERSION})")
+            return version
+
+        for number, description, step in MIGRATIONS:
+            if number <= version:
+                continue
+            with transaction() as conn:
+                # Базу мог обновить другой процесс, пока мы ждали блокировку
+                if get_schema_version(conn) >= number:
+                    continue
+                step(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {number}')
+            logger.info(f"Применена миграция {number}: {description}")
+        return get_schema_version(conn)
@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+from config.config import PLAYER_CACHE_SIZE
+from utils.metrics import metrics
+
+class PlayerState:
+    """Снимок состояния игрока: все, что нужно командам для отображения"""
+
+    def __init__(self, exists, country=None, political_system=None, budget=None,
+                 inventory=None, factories_count=0, regions=None, region_states=None,
+                 region_bits=(0, 0, (0, 0, 0)), region_effects=None):
+        self.exists = exists
+        self.country = country
+        self.political_system = political_system
+        self.budget = budget
+        self.inventory = inventory or {}
+        self.factories_count = factories_count
+        self.regions = regions or []
+        self.region_states = region_states or {}
+        # Маски контроля и повреждений, см. encode_region_states в config/regions.py
+        self.region_bits = region_bits
+        self.region_effects = region_effects
+
+class PlayerStateCache:
+    """LRU-кэш состояний игроков по user_id.
+
+    Записи удаляются функциями записи из utils/db.py после фиксации
+    транзакции. Номер поколения защищает от гонки, когда поток прочитал
+    старое состояние, а другой поток успел его изменить и сбросить кэш:
+    такое состояние в кэш уже не попадет.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.generation = 0
+        # База используется несколькими процессами бота (шарды в разных процессах)
+        self.shared = False
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self._data_versions = {}
+
+    def get(self, user_id):
+        """Возвращает состояние игрока или None, если его нет в кэше"""
+        with self._lock:
+            state = self._states.get(user_id)
+            if state is not None:
+                self._states.move_to_end(user_id)
+        metrics.increment('cache.player_state.hits' if state is not None else 'cache.player_state.misses')
+        return state
+
+    def put(self, user_id, state, generation):
+        """Сохраняет состояние, если с момента начала загрузки кэш не сбрасывался"""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._states[user_id] = state
+            self._states.move_to_end(user_id)
+            while len(self._states) > self.max_size:
+                self._states.popitem(last=False)
+                metrics.increment('cache.player_state.evictions')
+
+    def invalidate(self, *user_ids):
+        """Удаляет состояния указанных игроков"""
+        with self._lock:
+            self.generation += 1
+            for user_id in user_ids:
+                self._states.pop(user_id, None)
+
+    def sync(self, conn):
+        """Сбрасывает кэш, если с прошлой проверки базу изменило другое соединение.
+
+        Нужна, когда базу используют несколько процессов: их записи не
+        сбрасывают кэш этого процесса. PRAGMA data_version меняется после
+        фиксации транзакции любым другим соединением, поэтому сброс выполняется
+        и после записей других потоков этого процесса - это лишний, но
+        безопасный сброс. Первая проверка нового соединения тоже сбрасывает кэш.
+        """
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if self._data_versions.get(id(conn)) != version:
+            self._data_versions[id(conn)] = version
+            self.clear()
+            metrics.increment('cache.player_state.external_resets')
+
+    def clear(self):
+        """Полностью очищает кэш"""
+        with self._lock:
+            self.generation += 1
+            self._states.clear()
+
+    def __len__(self):
+        return len(self._states)
+
+player_cache = PlayerStateCache(PLAYER_CACHE_SIZE)
@@ -0,0 +1,63 @@
+"""Профилирование запуска бота.
+
+StartupProfiler отмечает последовательные этапы запуска (импорт модулей,
+создание бота, вход, миграции базы, загрузка когов, подключение к шлюзу,
+первая выполненная команда) от момента импорта этого модуля. main.py
+импортирует его первым, поэтому отсчет почти совпадает с началом процесса.
+Длительности этапов записываются в метрики startup.*_ms.
+
+summarize_importtime сводит вывод python -X importtime по пакетам верхнего
+уровня (см. benchmarks/bench_startup.py).
+"""
+import time
+import logging
+
+logger = logging.getLogger('vpi')
+
+class StartupProfiler:
+    """Отметки этапов запуска: (этап, мс от начала запуска, длительность этапа в мс)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        # Вывести сводку по этапам после первой выполненной команды
+        self.report_enabled = False
+        self._last = self.started
+
+    def mark(self, name):
+        """Отмечает окончание этапа, начавшегося с предыдущей отметки"""
+        from utils.metrics import metrics
+
+        now = time.perf_counter()
+        duration = (now - self._last) * 1000
+        self._last = now
+        self.phases.append((name, (now - self.started) * 1000, duration))
+        metrics.observe(f'startup.{name}_ms', duration)
+        logger.info(f"Этап запуска {name}: {duration:.0f} мс")
+
+    def is_marked(self, name):
+        return any(phase[0] == name for phase in self.phases)
+
+    def report(self):
+        """Сводка по этапам запуска в виде строк"""
+        lines = [f"{name:<15} {since_start:>9.1f} мс  (+{duration:.1f} мс)"
+                 for name, since_start, duration in self.phases]
+        return "\n".join(["Этапы запуска (от начала / длительность):"] + lines)
+
+def summarize_importtime(output, top=15):
+    """Сводит вывод python -X importtime по пакетам верхнего уровня.
+
+    Возвращает (суммарное время импорта в мс, список (пакет, мс) по убыванию
+    времени). Время пакета - сумма собственного времени всех его модулей.
+    """
+    packages = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    return sum(packages.values()), ranked[:top]
+
+startup_profiler = StartupProfiler()
@@ -0,0 +1,37 @@
+import os
+import logging
+from config.config import DB_JOURNAL_MODE
+from utils.db_pool import get_connection, get_pool
+
+logger = logging.getLogger('vpi')
+
+def configure_storage(conn):
+    """Включает режим журнала WAL (настройка сохраняется в файле базы)"""
+    journal_mode = conn.execute(f'PRAGMA journal_mode = {DB_JOURNAL_MODE}').fetchone()[0]
+    if journal_mode.upper() != DB_JOURNAL_MODE.upper():
+        logger.warning(f"Не удалось включить режим журнала {DB_JOURNAL_MODE}, текущий режим: {journal_mode}")
+    return journal_mode
+
+def checkpoint(mode='PASSIVE'):
+    """Выполняет чекпоинт WAL и возвращает (занято, страниц в WAL, перенесено страниц)"""
+    with get_connection() as conn:
+        return conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+
+def get_wal_size():
+    """Возвращает размер файла WAL в байтах"""
+    wal_path = get_pool().path + '-wal'
+    return os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+def get_storage_stats():
+    """Возвращает текущие настройки и размеры хранилища"""
+    with get_connection() as conn:
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    return {
+        'journal_mode': journal_mode,
+        'synchronous': synchronous,
+        'db_size': page_count * page_size,
+        'wal_size': get_wal_size()
+    }